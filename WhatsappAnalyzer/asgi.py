@@ -2,6 +2,7 @@
 ASGI config for WhatsappAnalyzer project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP is served by Django and WebSockets by the Channels routing in ``WhatsappAnalyzer.routing``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
@@ -9,8 +10,17 @@ https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from channels.routing import get_default_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'WhatsappAnalyzer.settings')
 
-application = get_asgi_application()
+django.setup()
+
+from src import chat_network  # noqa: E402 the Django settings have to be set up first
+
+# Daphne serves from a single process, so the analysis libraries are imported when it starts instead of on the first
+# upload
+chat_network.warm_up()
+
+application = get_default_application()
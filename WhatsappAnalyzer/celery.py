@@ -0,0 +1,18 @@
+import os
+
+from celery import Celery
+from celery.signals import worker_init
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'WhatsappAnalyzer.settings')
+
+app = Celery('WhatsappAnalyzer')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
+
+
+@worker_init.connect
+def warm_up(**kwargs):
+    # The prefork pool forks the worker processes after this signal, so they all share the analysis libraries
+    from src import chat_network
+
+    chat_network.warm_up()
@@ -1,5 +1,8 @@
-from channels.routing import ProtocolTypeRouter
+from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.sessions import SessionMiddlewareStack
+
+from web_analyzer.routing import websocket_urlpatterns
 
 application = ProtocolTypeRouter({
-    # (your routes here)
+    'websocket': SessionMiddlewareStack(URLRouter(websocket_urlpatterns)),
 })
@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     "django_sass",
     "django_plotly_dash.apps.DjangoPlotlyDashConfig",
+    "rest_framework",
     "web_analyzer",
     "channels",
     "session_cleanup",
@@ -88,6 +89,45 @@ DATABASES = {
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# Analysis results (plotly traces) are kept in their own cache, keyed by the hash of the chat export, so that the
+# session only needs to hold that key. Entries expire after TIMEOUT seconds and the oldest are culled when MAX_ENTRIES
+# is reached. The counters of the metrics (see web_analyzer.metrics) are kept in their own cache, shared by the web
+# and the analysis workers, and never expire. The file based cache cannot increment them atomically, so the counts are
+# best effort here; the production settings keep them in Redis.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'analysis': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'data', 'analysis_cache'),
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {
+            'MAX_ENTRIES': 300,
+            'CULL_FREQUENCY': 3,
+        },
+    },
+    'metrics': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'data', 'metrics'),
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
+}
+
+
+# Sessions
+# Sessions are stored as MessagePack (compressed with zlib by Django) instead of JSON. Sessions saved as JSON are still
+# read.
+
+SESSION_SERIALIZER = 'web_analyzer.session_serializers.MessagePackSerializer'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -201,3 +241,38 @@ LOGGING = {
 CELERYBEAT_SCHEDULE = {
     'session_cleanup': weekly_schedule
 }
+
+
+# Celery
+# Chat analyses run as Celery tasks. The chat text and the results travel through the analysis cache, so the broker
+# only carries the analysis key.
+
+CELERY_BROKER_URL = 'redis://127.0.0.1:6379/0'
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_BEAT_SCHEDULE = CELERYBEAT_SCHEDULE
+
+
+# Analysis executor
+# "celery" runs analyses on the Celery workers. "process_pool" runs them in a bounded process pool of the web process:
+# at most MAX_WORKERS analyses run at once, MAX_QUEUED more may wait, and further uploads are rejected until a slot is
+# free. Every analysis is aborted after TIMEOUT seconds and pool workers may not allocate more than MEMORY_LIMIT bytes.
+
+ANALYSIS_EXECUTOR = 'celery'
+# Log (and keep in the analysis cache) the time, rows and memory of every stage of each analysis
+ANALYSIS_PROFILING = False
+ANALYSIS_POOL = {
+    'MAX_WORKERS': 2,
+    'MAX_QUEUED': 4,
+    'TIMEOUT': 120,
+    'MEMORY_LIMIT': 1024 * 1024 * 1024,
+}
+
+
+# Upload storage
+# Uploaded chat exports are kept gzip compressed in LOCATION, named by the hash of their content. When they take more
+# than MAX_BYTES, the least recently used ones that no session references are deleted.
+
+UPLOAD_STORAGE = {
+    'LOCATION': os.path.join(BASE_DIR, 'data', 'uploads'),
+    'MAX_BYTES': 1024 * 1024 * 1024,
+}
@@ -34,6 +34,33 @@ DATABASES = {
 db_from_env = dj_database_url.config(conn_max_age=500)
 DATABASES['default'].update(db_from_env)
 
+# Redis evicts analysis results on its own when it reaches maxmemory (configure maxmemory-policy volatile-lru, so
+# that only keys with a timeout, like the analysis results and unlike the metrics, are evicted)
+CACHES['analysis'] = {
+    'BACKEND': 'django_redis.cache.RedisCache',
+    'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1'),
+    'TIMEOUT': 60 * 60 * 24,
+    'KEY_PREFIX': 'analysis',
+    'OPTIONS': {
+        'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+        'COMPRESSOR': 'django_redis.compressors.zlib.ZlibCompressor',
+    },
+}
+
+CACHES['metrics'] = {
+    'BACKEND': 'django_redis.cache.RedisCache',
+    'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1'),
+    'TIMEOUT': None,
+    'KEY_PREFIX': 'metrics',
+    'OPTIONS': {
+        'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+    },
+}
+
+CELERY_BROKER_URL = os.environ.get('REDIS_URL', CELERY_BROKER_URL)
+
+CHANNEL_LAYERS['default']['CONFIG']['hosts'] = [os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0')]
+
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
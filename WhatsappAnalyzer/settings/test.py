@@ -1 +1,34 @@
+import tempfile
+
 from .base import *
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'analysis': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'analysis',
+        'OPTIONS': {
+            'MAX_ENTRIES': 300,
+        },
+    },
+    'metrics': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'metrics',
+    },
+}
+
+CELERY_TASK_ALWAYS_EAGER = True
+CELERY_BROKER_URL = 'memory://'
+
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    },
+}
+
+UPLOAD_STORAGE = {
+    'LOCATION': os.path.join(tempfile.gettempdir(), 'whatsapp_analyzer_test_uploads'),
+    'MAX_BYTES': 1024 * 1024,
+}
@@ -0,0 +1,67 @@
+"""Compare the size and the encoding time of session payloads with the JSON and the MessagePack session serializers.
+
+The sessions are encoded as Django stores them (serialized, zlib compressed, signed and base64 encoded). "current"
+is the session this app keeps (the analysis key and the selection); "with traces" also carries the plotly traces of a
+chat of --users participants, as sessions did before the traces moved to the analysis cache.
+
+    PYTHONPATH=. python benchmarks/session_payload.py --users 20
+"""
+import argparse
+import os
+import timeit
+
+import django
+
+
+def synthetic_chat(users, messages):
+    import numpy as np
+    import pandas as pd
+
+    random = np.random.default_rng(0)
+    return pd.DataFrame({
+        "Time": pd.date_range("2020-01-01", periods=messages, freq="7min"),
+        "User": [f"User {user}" for user in random.integers(users, size=messages)],
+        "Message": "Hola",
+    })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-u", "--users", type=int, default=20, help="participants of the chat drawn for the traces")
+    parser.add_argument("-n", "--number", type=int, default=200, help="encodings timed per measure")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "WhatsappAnalyzer.settings.test")
+    django.setup()
+    from django.contrib.sessions.backends.signed_cookies import SessionStore
+    from django.core.signing import JSONSerializer
+
+    from src.chat_network import ChatNetwork
+    from web_analyzer.session_serializers import MessagePackSerializer
+
+    current = {"chat_file_name": "WhatsApp Chat.txt", "analysis_key": "0" * 64, "selected_nodes": ["User 1"]}
+    _, node_traces, edge_traces, selection_index = ChatNetwork(
+        chat=synthetic_chat(args.users, 50 * args.users)
+    ).draw(return_traces=True)
+    sessions = {
+        "current": current,
+        "with traces": {**current, "node_traces": node_traces, "edge_traces": edge_traces},
+    }
+
+    print(f"{'session':<14}{'serializer':<23}{'bytes':>10}{'encode (ms)':>13}{'decode (ms)':>13}")
+    for session_name, session in sessions.items():
+        for serializer in (JSONSerializer, MessagePackSerializer):
+            store = SessionStore()
+            store.serializer = serializer
+            payload = store.encode(session)
+            assert store.decode(payload) == session
+            encode_time = timeit.timeit(lambda: store.encode(session), number=args.number) / args.number
+            decode_time = timeit.timeit(lambda: store.decode(payload), number=args.number) / args.number
+            print(
+                f"{session_name:<14}{serializer.__name__:<23}{len(payload):>10}"
+                f"{encode_time * 1000:>13.3f}{decode_time * 1000:>13.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
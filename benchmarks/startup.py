@@ -0,0 +1,57 @@
+"""Time the cold start of the library and the web workers.
+
+Every measure runs in a fresh interpreter, so it includes the imports of the dependencies. "import" is what a process
+pays before it can serve or analyse anything; "warm_up" is what `chat_network.warm_up` adds when a server imports
+the analysis libraries as it starts.
+
+    PYTHONPATH=. python benchmarks/startup.py --repeat 5
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+
+TIMER = """
+import time
+start = time.perf_counter()
+{code}
+print(time.perf_counter() - start)
+"""
+TARGETS = {
+    "library": "import src.chat_network",
+    "batch CLI": "import src.batch",
+    "web worker": (
+        "import os, django\n"
+        "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'WhatsappAnalyzer.settings.test')\n"
+        "django.setup()\n"
+        "import WhatsappAnalyzer.urls"
+    ),
+}
+WARM_UP = "from src import chat_network\nchat_network.warm_up()"
+
+
+def time_code(code, setup=""):
+    output = subprocess.run(
+        [sys.executable, "-c", setup + "\n" + TIMER.format(code=code)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return float(output.split()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="runs of every measure, the median is reported")
+    args = parser.parse_args(argv)
+
+    print(f"{'target':<12}{'import (s)':>12}{'warm_up (s)':>14}")
+    for name, code in TARGETS.items():
+        import_time = statistics.median(time_code(code) for _ in range(args.repeat))
+        warm_up_time = statistics.median(time_code(WARM_UP, setup=code) for _ in range(args.repeat))
+        print(f"{name:<12}{import_time:>12.3f}{warm_up_time:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
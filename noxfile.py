@@ -110,6 +110,12 @@ def tests(session):
     session.run("pytest", *args)
 
 
+@nox.session(python=["3.7"])
+def startup_benchmark(session):
+    session.run("poetry", "install", external=True)
+    session.run("python", "benchmarks/startup.py", *session.posargs, env={"PYTHONPATH": "."})
+
+
 def install_with_constraints(session, *args, **kwargs):
     with tempfile.NamedTemporaryFile(mode="w+b", delete=False) as requirements:
         filename = requirements.name
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+from src.profiling import profiled
+
+
+DIMENSIONS = ("user", "hour", "weekday", "month")
+HOURS = tuple(range(24))
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+
+class ActivityCube(object):
+    """Messages of a chat counted by user, hour of the day, weekday and month.
+
+    The dense users x 24 x 7 x months array is filled once, by a single `np.bincount` over the integer codes of the
+    four components of every message, so any heatmap or timeline is a sum over some of its axes instead of a groupby
+    over the chat.
+    """
+
+    def __init__(self, counts, users, months):
+        self.counts = counts
+        self.users = pd.Index(users, name="User")
+        self.months = pd.PeriodIndex(months, freq="M", name="Month")
+        self.labels = {
+            "user": self.users,
+            "hour": pd.Index(HOURS, name="Hour"),
+            "weekday": pd.CategoricalIndex(WEEKDAYS, categories=WEEKDAYS, ordered=True, name="Weekday"),
+            "month": self.months,
+        }
+
+    @classmethod
+    @profiled("activity_cube")
+    def from_chat(cls, chat):
+        user_codes, users = pd.factorize(chat["User"], sort=True)
+        times = chat["Time"].dt
+        month_numbers = (times.year * 12 + times.month - 1).to_numpy()
+        first_month = month_numbers.min() if len(chat) else 0
+        num_months = month_numbers.max() - first_month + 1 if len(chat) else 0
+
+        shape = (len(users), len(HOURS), len(WEEKDAYS), num_months)
+        cell_ids = np.ravel_multi_index(
+            (user_codes, times.hour.to_numpy(), times.weekday.to_numpy(), month_numbers - first_month), shape
+        )
+        counts = np.bincount(cell_ids, minlength=int(np.prod(shape))).reshape(shape).astype(np.int32)
+        months = (
+            pd.period_range(chat["Time"].min().to_period("M"), periods=num_months, freq="M")
+            if len(chat)
+            else pd.PeriodIndex([], freq="M")
+        )
+        return cls(counts, users, months)
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def _positions(self, dimension, selected):
+        labels = self.labels[dimension]
+        if dimension == "month":
+            selected = [pd.Period(month, freq="M") for month in selected]
+        positions = labels.get_indexer(selected)
+        if (positions < 0).any():
+            unknown = [label for label, position in zip(selected, positions) if position < 0]
+            raise KeyError(f"Unknown {dimension} {unknown}")
+        return positions
+
+    def rollup(self, *dimensions, users=None, hours=None, weekdays=None, months=None):
+        """Messages by the given dimensions (of `DIMENSIONS`), added up over the rest, counting only the selected
+        users, hours, weekdays and months.
+
+        Without dimensions it is the number of messages, with one of them a Series and with two a DataFrame indexed by
+        the first and with a column for every label of the second. With more, a Series with a MultiIndex.
+        """
+        unknown_dimensions = set(dimensions) - set(DIMENSIONS)
+        if unknown_dimensions:
+            raise ValueError(f"Unknown dimensions {sorted(unknown_dimensions)}, use some of {DIMENSIONS}")
+
+        counts = self.counts
+        labels = dict(self.labels)
+        for axis, (dimension, selected) in enumerate(zip(DIMENSIONS, (users, hours, weekdays, months))):
+            if selected is not None:
+                positions = self._positions(dimension, selected)
+                counts = counts.take(positions, axis=axis)
+                labels[dimension] = labels[dimension][positions]
+
+        summed_axes = tuple(axis for axis, dimension in enumerate(DIMENSIONS) if dimension not in dimensions)
+        counts = counts.sum(axis=summed_axes)
+        kept_dimensions = [dimension for dimension in DIMENSIONS if dimension in dimensions]
+        counts = counts.transpose([kept_dimensions.index(dimension) for dimension in dimensions])
+
+        if not dimensions:
+            return int(counts)
+        if len(dimensions) == 1:
+            return pd.Series(counts, index=labels[dimensions[0]], name="messages")
+        if len(dimensions) == 2:
+            return pd.DataFrame(counts, index=labels[dimensions[0]], columns=labels[dimensions[1]])
+        return pd.Series(
+            counts.ravel(),
+            index=pd.MultiIndex.from_product([labels[dimension] for dimension in dimensions]),
+            name="messages",
+        )
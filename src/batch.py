@@ -0,0 +1,137 @@
+"""Analyse many chat exports offline.
+
+Reads every export matched by the given directories or glob patterns, weights its reply network in a process pool and
+writes the edge and node tables of each chat to Parquet or Feather files. Chats whose tables already exist are skipped,
+so an interrupted run can be resumed by running the same command again. The tables keep the layout of the exports
+under the common directory of the inputs (or `--root`), so it does not depend on which exports a pattern matched.
+
+    analyse-chats "exports/*.txt" --output tables --workers 8 --format parquet
+"""
+import argparse
+import concurrent.futures
+import glob
+import itertools
+import os
+from pathlib import Path
+import sys
+
+from src import whatsapp
+from src.chat_network import ChatNetwork
+
+
+OUTPUT_FORMATS = {
+    "parquet": lambda table, path: table.to_parquet(path, index=False),
+    "feather": lambda table, path: table.to_feather(path),
+}
+TABLES = ("edges", "nodes")
+
+
+def find_chat_exports(inputs, pattern="*.txt"):
+    chat_exports = set()
+    for chat_input in inputs:
+        if os.path.isdir(chat_input):
+            chat_exports.update(Path(chat_input).rglob(pattern))
+        else:
+            chat_exports.update(Path(path) for path in glob.glob(chat_input, recursive=True) if os.path.isfile(path))
+    return sorted(chat_exports)
+
+
+def input_root(chat_input):
+    """Directory of an input: the directory itself or the part of a glob pattern before its first wildcard"""
+    if os.path.isdir(chat_input):
+        return Path(chat_input)
+
+    parts = Path(chat_input).parts
+    fixed_parts = list(itertools.takewhile(lambda part: not glob.has_magic(part), parts))
+    if len(fixed_parts) == len(parts):
+        fixed_parts = fixed_parts[:-1]
+    return Path(*fixed_parts) if fixed_parts else Path(".")
+
+
+def exports_root(inputs):
+    return Path(os.path.commonpath([os.path.abspath(input_root(chat_input)) for chat_input in inputs]))
+
+
+def output_paths(chat_export, root, output_directory, output_format):
+    """Tables of a chat, keeping the layout of the exports under `root` so that chats with the same name do not
+    clash"""
+    stem = Path(os.path.abspath(chat_export)).relative_to(os.path.abspath(root)).with_suffix("")
+    return {table: Path(output_directory) / f"{stem}.{table}.{output_format}" for table in TABLES}
+
+
+def analyse_chat_export(chat_export, paths, output_format):
+    chat = whatsapp.read_chat(str(chat_export), collapse=False)
+    tables = dict(zip(TABLES, ChatNetwork(chat=chat).get_statistics()))
+
+    write_table = OUTPUT_FORMATS[output_format]
+    for table_name, path in paths.items():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial_path = path.with_name(path.name + ".partial")
+        write_table(tables[table_name].reset_index(drop=True), partial_path)
+        os.replace(partial_path, path)
+
+    return len(chat)
+
+
+def analyse_chat_exports(chat_exports, root, output_directory, output_format="parquet", workers=None, log=print):
+    """Analyse the chats under `root` whose tables are not in `output_directory` yet. Returns the exports that could
+    not be analysed."""
+    if not chat_exports:
+        return []
+
+    pending = {}
+    for chat_export in chat_exports:
+        paths = output_paths(chat_export, root, output_directory, output_format)
+        if all(path.is_file() for path in paths.values()):
+            log(f"Skipping {chat_export}, already analysed")
+        else:
+            pending[chat_export] = paths
+
+    failed = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(analyse_chat_export, chat_export, paths, output_format): chat_export
+            for chat_export, paths in pending.items()
+        }
+        for future in concurrent.futures.as_completed(futures):
+            chat_export = futures[future]
+            try:
+                num_messages = future.result()
+            except Exception as error:
+                log(f"Failed {chat_export}: {error!r}")
+                failed.append(chat_export)
+            else:
+                log(f"Analysed {chat_export} ({num_messages} messages)")
+
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="+", help="directories or glob patterns of chat exports")
+    parser.add_argument("-o", "--output", default="tables", help="directory where the tables are written")
+    parser.add_argument("-f", "--format", choices=sorted(OUTPUT_FORMATS), default="parquet")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="number of processes (default: CPUs)")
+    parser.add_argument("--pattern", default="*.txt", help="file pattern looked for in input directories")
+    parser.add_argument(
+        "--root", default=None, help="directory whose layout is kept in the output (default: common input directory)"
+    )
+    args = parser.parse_args(argv)
+
+    chat_exports = find_chat_exports(args.inputs, args.pattern)
+    root = Path(args.root) if args.root else exports_root(args.inputs)
+    root_path = os.path.abspath(root)
+    outside_root = [
+        chat_export for chat_export in chat_exports
+        if os.path.commonpath([root_path, os.path.abspath(chat_export)]) != root_path
+    ]
+    if outside_root:
+        parser.error(f"{outside_root[0]} is not under the root directory {root}")
+
+    failed = analyse_chat_exports(chat_exports, root, args.output, args.format, args.workers)
+    print(f"{len(chat_exports) - len(failed)} of {len(chat_exports)} chats analysed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
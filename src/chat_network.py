@@ -1,102 +1,195 @@
+import copy
+import importlib
+import itertools
 import json
 
-import matplotlib as mpl
-import matplotlib.cm as cm
-import networkx as nx
 import numpy as np
 import pandas as pd
-import plotly
-import plotly.graph_objects as go
-from scipy.optimize import minimize
-from scipy.stats import norm
 
 from src import whatsapp
+from src.profiling import profiled, stage
+from src.progress import report
+from src.selection_index import SelectionIndex
+from src.transition_index import (
+    count_matrix_to_edge_counts,
+    previous_speakers_matrix,
+    SlidingWindowCounts,
+    TransitionIndex,
+)
+
+
+# Drawing and weighting libraries, imported by the methods that need them so that importing this module (as every web
+# worker and the batch CLI do) stays cheap. Daphne calls `warm_up` when it starts and the Celery worker before forking.
+LAZY_MODULES = ("matplotlib.cm", "networkx", "plotly.graph_objects", "scipy.optimize", "scipy.stats")
+
+
+def warm_up():
+    for module in LAZY_MODULES:
+        importlib.import_module(module)
 
 
 class ChatNetwork(object):
     NORMALIZATION_TYPE_DEVIATION = "MLE_multinomial_distribution_difference_in_standard_deviations"
     NORMALIZATION_TYPE_CDF = "MLE_multinomial_distribution_CDF"
-
-    def __init__(self, whatsapp_export_file_name=None, whatsapp_export_file=None):
-        self.chat = (
-            whatsapp.read_chat(whatsapp_export_file_name, whatsapp_export_file)
-            if (whatsapp_export_file_name or whatsapp_export_file) else None
+    NORMALIZATION_TYPE_MEDIAN_REPLY_LATENCY = "median_reply_latency"
+    NORMALIZATION_TYPE_P90_REPLY_LATENCY = "p90_reply_latency"
+    REPLY_LATENCY_QUANTILES = {NORMALIZATION_TYPE_MEDIAN_REPLY_LATENCY: 0.5, NORMALIZATION_TYPE_P90_REPLY_LATENCY: 0.9}
+    # Lower bounds of the bins of the reply latency histograms, the last bin has no upper bound
+    REPLY_LATENCY_BINS = ("0s", "1min", "5min", "15min", "1h", "6h", "1D")
+    ADAPTIVE_CONVERSATION_GAP = "adaptive"
+
+    def __init__(self, whatsapp_export_file_name=None, whatsapp_export_file=None, chat=None, conversation_gap=None):
+        """With a `conversation_gap` (a timedelta or "adaptive", see `conversation_gap_threshold`) the chat is cut in
+        conversations wherever two messages are further apart, and the first message of a conversation is not taken
+        as a reply to the previous message.
+
+        The chat may be given as read with `collapse=False`: it is collapsed here, keeping the time of the last message
+        of every turn to measure the silences after it."""
+        chat = (
+            whatsapp.read_chat(whatsapp_export_file_name, whatsapp_export_file, collapse=False)
+            if (whatsapp_export_file_name or whatsapp_export_file) else chat
         )
+        self.chat, self.turn_ends = self._collapse(chat)
+        self.conversation_gap = conversation_gap
+
+    @classmethod
+    def _collapse(cls, chat):
+        """Chat with the consecutive messages of a user joined in one turn, like `whatsapp.read_chat`, and the time of
+        the last message of every turn. The turns of a chat that was already collapsed end when they start."""
+        if chat is None:
+            return None, None
+
+        change_user = chat["User"] != chat["User"].shift(1)
+        if change_user.all():
+            return chat, chat["Time"]
+
+        turn_ids = change_user.cumsum().rename(None)
+        return whatsapp.collapse_same_user_messages(chat), chat["Time"].groupby(turn_ids).last()
 
     def draw(
             self,
-            layout=nx.drawing.circular_layout,
+            layout=None,
             return_traces=False,
             node_traces=None,
             edge_traces=None,
+            selection_index=None,
             selected_nodes=None,
     ):
-        if not (node_traces and edge_traces):
-            node_traces, edge_traces = self.get_traces(layout)
+        if not (node_traces and edge_traces and selection_index):
+            node_traces, edge_traces, selection_index = self.get_traces(layout)
         else:
-            node_traces = json.loads(node_traces)
-            edge_traces = json.loads(edge_traces)
+            node_traces, edge_traces, selection_index = self.traces_from_json(
+                node_traces, edge_traces, selection_index
+            )
+
+        node_traces_filtered, edge_traces_filtered = self.filter_traces(
+            node_traces, edge_traces, selection_index, selected_nodes, keep_hidden_edges=True
+        )
+        import plotly.graph_objects as go
 
-        node_traces_filtered, edge_traces_filtered = self.filter_traces(node_traces, edge_traces, selected_nodes)
+        with stage("figure", rows_in=len(edge_traces_filtered) + len(node_traces_filtered)):
+            figure = go.Figure(data=edge_traces_filtered + node_traces_filtered, layout=self._graph_layout())
 
         if return_traces:
-            return (
-                go.Figure(data=edge_traces_filtered + node_traces_filtered, layout=self._graph_layout()),
-                json.dumps(node_traces, cls=plotly.utils.PlotlyJSONEncoder),
-                json.dumps(edge_traces, cls=plotly.utils.PlotlyJSONEncoder),
-            )
+            return (figure, *self.traces_to_json(node_traces, edge_traces, selection_index))
 
-        return go.Figure(data=edge_traces_filtered + node_traces_filtered, layout=self._graph_layout())
+        return figure
 
     @classmethod
-    def filter_traces(cls, node_traces, edge_traces, selected_nodes=None):
-        def node_belongs_to_selected_nodes(node_key):
-            return node_key in selected_nodes if selected_nodes else False
-
-        def edge_belongs_to_selected_nodes(edge_key):
-            if not selected_nodes:
-                return True
-
-            node1, node2 = edge_key.split(":")
-            if len(selected_nodes) == 1:
-                return (
-                    node1 in selected_nodes
-                    or node2 in selected_nodes
-                )
+    def traces_to_json(cls, node_traces, edge_traces, selection_index):
+        import plotly
 
-            return (
-                node1 in selected_nodes
-                and node2 in selected_nodes
-            )
+        return (
+            json.dumps(node_traces, cls=plotly.utils.PlotlyJSONEncoder),
+            json.dumps(edge_traces, cls=plotly.utils.PlotlyJSONEncoder),
+            selection_index.to_json(),
+        )
 
-        def adapt_opacity(node, trace):
-            if node_belongs_to_selected_nodes(node):
-                trace["marker"]["opacity"] = 1
-            else:
-                trace["marker"]["opacity"] = 0.5
+    @classmethod
+    def traces_from_json(cls, node_traces, edge_traces, selection_index):
+        return json.loads(node_traces), json.loads(edge_traces), SelectionIndex.from_json(selection_index)
 
-            return trace
+    @classmethod
+    def filter_traces(cls, node_traces, edge_traces, selection_index, selected_nodes=None, keep_hidden_edges=False):
+        selected_node_ids = selection_index.selected_node_ids(selected_nodes)
+        visible_edges = selection_index.visible_edges(selected_node_ids)
 
         node_traces_filtered = [
-            adapt_opacity(node, trace) for node, trace in node_traces.items()
+            cls._with_opacity(trace, cls._node_opacity(selection_index.node_ids.get(node) in selected_node_ids))
+            for node, trace in node_traces.items()
         ]
 
-        edge_traces_filtered = [
-            trace
-            for key, traces in edge_traces.items()
-            for trace in traces
-            if edge_belongs_to_selected_nodes(key)
-        ]
+        if keep_hidden_edges:
+            edge_traces_filtered = [
+                trace if edge_id in visible_edges else cls._with_visibility(trace, False)
+                for edge_id, traces in enumerate(edge_traces)
+                for trace in traces
+            ]
+        else:
+            edge_traces_filtered = [
+                trace
+                for edge_id in sorted(visible_edges)
+                for trace in edge_traces[edge_id]
+            ]
 
         return node_traces_filtered, edge_traces_filtered
 
-    def get_traces(self, layout=nx.drawing.circular_layout):
+    @classmethod
+    def figure_selection_delta(cls, selection_index, previous_selected_nodes, selected_nodes):
+        changed_nodes, changed_edges = selection_index.selection_changes(previous_selected_nodes, selected_nodes)
+        selected_node_ids = selection_index.selected_node_ids(selected_nodes)
+
+        return {
+            "visible": {
+                position: changed_edges[edge_id]
+                for edge_id in sorted(changed_edges)
+                for position in selection_index.edge_trace_positions(edge_id)
+            },
+            "opacity": {
+                selection_index.node_trace_position(node_id): cls._node_opacity(node_id in selected_node_ids)
+                for node_id in sorted(changed_nodes)
+            },
+        }
+
+    @classmethod
+    def apply_figure_selection_delta(cls, figure, delta):
+        data = list(figure["data"])
+        for position, visible in delta["visible"].items():
+            data[int(position)] = dict(data[int(position)], visible=visible)
+        for position, opacity in delta["opacity"].items():
+            trace = data[int(position)]
+            data[int(position)] = dict(trace, marker=dict(trace.get("marker", {}), opacity=opacity))
+        return dict(figure, data=data)
+
+    @classmethod
+    def _node_opacity(cls, is_selected):
+        return 1 if is_selected else 0.5
+
+    @classmethod
+    def _with_opacity(cls, trace, opacity):
+        trace = copy.deepcopy(trace)
+        trace["marker"]["opacity"] = opacity
+        return trace
+
+    @classmethod
+    def _with_visibility(cls, trace, visible):
+        trace = copy.deepcopy(trace)
+        trace["visible"] = visible
+        return trace
+
+    def get_traces(self, layout=None):
         node_positions, node_sizes, edges = self.get_drawing_parameters(layout)
 
         node_traces = self.get_node_traces(node_positions, node_sizes)
         edge_traces = self.get_edge_traces(node_positions, edges)
+        selection_index = SelectionIndex(
+            node_traces.keys(),
+            edge_traces.keys(),
+            edge_trace_counts=[len(traces) for traces in edge_traces.values()],
+        )
+        report("traces_built", nodes=len(node_traces), edges=len(edge_traces))
 
-        return node_traces, edge_traces
+        return node_traces, list(edge_traces.values()), selection_index
 
     def get_drawing_parameters(self, layout):
         node_positions = self.node_positions(layout)
@@ -110,8 +203,32 @@ class ChatNetwork(object):
 
         return node_positions, node_sizes, edges
 
+    @profiled("statistics")
+    def get_statistics(self):
+        edges = self.get_directed_edges(
+            count="count", CDF=self.NORMALIZATION_TYPE_CDF, deviations=self.NORMALIZATION_TYPE_DEVIATION
+        ).reset_index()
+        nodes = (
+            pd.concat(
+                [
+                    self.chat["User"].value_counts().rename("messages"),
+                    edges.groupby("Target")["count"].sum().rename("replies_received"),
+                ],
+                axis="columns",
+            )
+            .fillna(0)
+            .astype(int)
+            .rename_axis(index="node")
+            .reset_index()
+        )
+        nodes["replies_received_share"] = nodes["replies_received"] / nodes["replies_received"].sum()
+
+        return edges, nodes
+
     @classmethod
     def _graph_layout(cls):
+        import plotly.graph_objects as go
+
         layout_plotly = go.Layout(
             xaxis=go.layout.XAxis(
                 range=[-1.25, 1.25],
@@ -128,7 +245,12 @@ class ChatNetwork(object):
         )
         return layout_plotly
 
-    def node_positions(self, layout=nx.drawing.circular_layout):
+    @profiled("layout")
+    def node_positions(self, layout=None):
+        """Positions of the nodes given by a networkx `layout` (by default, the circular layout)"""
+        import networkx as nx
+
+        layout = layout or nx.drawing.circular_layout
         pos = layout(self.get_directed_graph("count"))
 
         return (pd.DataFrame(pos, index=["X", "Y"])
@@ -136,7 +258,10 @@ class ChatNetwork(object):
                 .rename_axis(index="node"))
 
     @classmethod
+    @profiled("node_traces")
     def get_node_traces(cls, node_positions, size_magnitude):
+        import plotly.graph_objects as go
+
         size_magnitude_normalized = size_magnitude / size_magnitude.sum()
         radius = node_positions.apply(lambda g: np.linalg.norm(g), axis="columns").mean()
         circumference = radius * 2 * np.pi
@@ -165,7 +290,12 @@ class ChatNetwork(object):
         return node_traces
 
     @classmethod
+    @profiled("edge_traces")
     def get_edge_traces(cls, node_positions, edges):
+        import matplotlib as mpl
+        import matplotlib.cm as cm
+        import plotly.graph_objects as go
+
         def node_positions_to_edge_node_positions(edges):
             edge_source_positions = (node_positions
                                      .loc[edges["Source"]]
@@ -223,7 +353,7 @@ class ChatNetwork(object):
         edge_node_positions = node_positions_to_edge_node_positions(united_edges)
 
         edge_traces = {
-            f"{source}:{target}":
+            (source, target):
             get_edge_segment_traces(
                 x_source,
                 y_source,
@@ -266,6 +396,8 @@ class ChatNetwork(object):
         return list(self.chat["User"].unique())
 
     def get_directed_graph(self, weight_normalization="no_normalization"):
+        import networkx as nx
+
         directed_edges_weighted = self.get_directed_edges(weight_normalization)
 
         return nx.from_pandas_edgelist(
@@ -277,6 +409,8 @@ class ChatNetwork(object):
         )
 
     def get_multi_directed_graph(self):
+        import networkx as nx
+
         source_target = self.get_directed_edges()
 
         return nx.from_pandas_edgelist(
@@ -288,13 +422,14 @@ class ChatNetwork(object):
             create_using=nx.MultiDiGraph,
         )
 
+    @profiled("directed_edges")
     def get_directed_edges(self, weight_normalization="no_normalization", **kwargs):
         multi_directed_edges = (
             pd.concat(
                 [
                     self.chat["Time"],
                     self.chat["User"].rename("Source"),
-                    self.chat["User"].shift(1).rename("Target"),
+                    self._replied_users().rename("Target"),
                 ],
                 axis="columns",
             )
@@ -307,8 +442,180 @@ class ChatNetwork(object):
         if weight_normalization == "no_normalization" and not kwargs_present:
             return multi_directed_edges
 
-        return self.directed_edges_to_weighted(
-            multi_directed_edges, normalization=weight_normalization, **kwargs
+        normalization_columns = kwargs if kwargs_present else {"weight": weight_normalization}
+        latency_columns = {
+            column_name: normalization_type
+            for column_name, normalization_type in normalization_columns.items()
+            if normalization_type in self.REPLY_LATENCY_QUANTILES
+        }
+        if not latency_columns:
+            return self.directed_edges_to_weighted(
+                multi_directed_edges, normalization=weight_normalization, **kwargs
+            )
+
+        count_columns = {
+            column_name: normalization_type
+            for column_name, normalization_type in normalization_columns.items()
+            if column_name not in latency_columns
+        }
+        weighted_edges = self.directed_edges_to_weighted(multi_directed_edges, **(count_columns or {"count": "count"}))
+
+        latency_statistics = self.get_reply_latency_statistics(quantiles=self.REPLY_LATENCY_QUANTILES.values())
+        for column_name, normalization_type in latency_columns.items():
+            quantile_column = self._quantile_column(self.REPLY_LATENCY_QUANTILES[normalization_type])
+            weighted_edges[column_name] = latency_statistics[quantile_column].reindex(weighted_edges.index)
+
+        return weighted_edges[list(normalization_columns)]
+
+    @profiled("previous_speakers_edges")
+    def get_previous_speakers_edges(self, k=3, decay=0.5, lookback=None):
+        """Edges weighted by the credit every message (Source) gives to each of the `k` previous distinct speakers
+        (Target), the r-th most recent one with weight decay ** (r - 1). See `previous_speakers_matrix`."""
+        users = pd.Index(self.chat["User"].unique()).sort_values()
+        conversation_ids = self.get_conversation_ids().to_numpy() if self.conversation_gap is not None else None
+        weight_matrix = previous_speakers_matrix(
+            users.get_indexer(self.chat["User"]), len(users), k, decay, lookback, conversation_ids
+        )
+        return count_matrix_to_edge_counts(weight_matrix, users).rename("weight")
+
+    def _replied_users(self):
+        """User of the previous message, unless the message starts a conversation"""
+        previous_user = self.chat["User"].shift(1)
+        if self.conversation_gap is None:
+            return previous_user
+        return previous_user.mask(self._silences() > self.conversation_gap_threshold(self.conversation_gap))
+
+    def _silences(self):
+        """Time from the end of the previous turn to every message"""
+        return self.chat["Time"] - self.turn_ends.shift(1)
+
+    def conversation_gap_threshold(self, gap):
+        """Timedelta of a `gap`. The "adaptive" gap is the upper Tukey fence (Q3 + 1.5 IQR) of the logarithm of the
+        gaps between messages, so only unusually long silences for this chat start a new conversation."""
+        if gap != self.ADAPTIVE_CONVERSATION_GAP:
+            return pd.Timedelta(gap)
+
+        log_gaps = np.log1p(self._silences().dropna().dt.total_seconds().clip(lower=0))
+        if log_gaps.empty:
+            return pd.Timedelta.max
+        first_quartile, third_quartile = log_gaps.quantile([0.25, 0.75])
+        return pd.Timedelta(seconds=np.expm1(third_quartile + 1.5 * (third_quartile - first_quartile)))
+
+    @profiled("conversations")
+    def get_conversation_ids(self, gap=None):
+        """Number (from 1) of the conversation of every message. `gap` defaults to the conversation gap of the network
+        or, if it has none, to the adaptive gap."""
+        gap = gap or self.conversation_gap or self.ADAPTIVE_CONVERSATION_GAP
+        starts_conversation = self._silences() > self.conversation_gap_threshold(gap)
+        return starts_conversation.cumsum().add(1).rename("Conversation")
+
+    @profiled("conversation_statistics")
+    def get_conversation_statistics(self, gap=None):
+        """Start, end, duration, messages, participants and initiator of every conversation"""
+        statistics = self.chat.assign(End=self.turn_ends).groupby(self.get_conversation_ids(gap)).agg(
+            start=("Time", "first"),
+            end=("End", "last"),
+            messages=("User", "size"),
+            participants=("User", "nunique"),
+            initiator=("User", "first"),
+        )
+        statistics.insert(2, "duration", statistics["end"] - statistics["start"])
+        return statistics
+
+    @profiled("reply_latencies")
+    def get_reply_latencies(self):
+        """Directed edges of the messages that reply to a different user, with the time since the last message of the
+        replied turn"""
+        previous_user = self._replied_users()
+        is_reply = previous_user.notna() & (self.chat["User"] != previous_user)
+        return (
+            pd.concat(
+                [
+                    self.chat["Time"],
+                    self.chat["User"].rename("Source"),
+                    previous_user.rename("Target"),
+                    self._silences().rename("Latency"),
+                ],
+                axis="columns",
+            )
+            .loc[is_reply]
+            .reset_index(drop=False)
+        )
+
+    @profiled("reply_latency_statistics")
+    def get_reply_latency_statistics(self, by="edge", quantiles=(0.5, 0.9), bins=REPLY_LATENCY_BINS):
+        """Replies, latency quantiles (in seconds) and histogram of the reply latencies of every edge (Source replying
+        to Target) or, with by="user", of every user replying.
+
+        Quantile columns are named "median" or "p<percentile>" and histogram columns after the bins, like "1min-5min".
+        """
+        group_fields = {"edge": ["Source", "Target"], "user": ["Source"]}[by]
+        latencies = self.get_reply_latencies()
+        seconds = latencies["Latency"].dt.total_seconds()
+        groups = [latencies[field] for field in group_fields]
+        grouped_seconds = seconds.groupby(groups)
+
+        statistics = [grouped_seconds.count().rename("replies")]
+        statistics += [grouped_seconds.quantile(q).rename(self._quantile_column(q)) for q in quantiles]
+
+        bin_edges = [pd.Timedelta(bin_start).total_seconds() for bin_start in bins] + [np.inf]
+        bin_labels = [f"{start}-{end}" for start, end in zip(bins[:-1], bins[1:])] + [f"{bins[-1]}+"]
+        latency_bins = pd.cut(seconds, bin_edges, right=False, labels=bin_labels)
+        statistics.append(pd.get_dummies(latency_bins).groupby(groups).sum()[bin_labels])
+
+        statistics = pd.concat(statistics, axis="columns")
+        statistics.columns.name = None
+        return statistics.rename_axis(index="User") if by == "user" else statistics
+
+    @classmethod
+    def _quantile_column(cls, quantile):
+        return "median" if quantile == 0.5 else f"p{quantile * 100:g}"
+
+    def get_transition_index(self, freq="D"):
+        return TransitionIndex(self.get_directed_edges(), freq=freq)
+
+    @classmethod
+    def get_window_directed_edges(
+            cls, transition_index, start=None, end=None, weight_normalization="count", **kwargs
+    ):
+        directed_edges_count = transition_index.edge_counts(start, end)
+        if directed_edges_count.empty:
+            columns = list(kwargs) if kwargs else ["weight"]
+            return pd.DataFrame(columns=columns, index=directed_edges_count.index)
+
+        return cls.directed_edge_counts_to_weighted(directed_edges_count, weight_normalization, **kwargs)
+
+    def get_temporal_network(self, window, step, start=None, end=None, weight_normalization="count", **kwargs):
+        """Edges and node sizes of a window of length `window` moved `step` by `step` over the chat.
+
+        Returns the weighted edges of every window, indexed by the start of the window, and a windows x users frame
+        with the replies received by each user in every window.
+        """
+        sliding_window_counts = SlidingWindowCounts(self.get_directed_edges())
+        columns = list(kwargs) if kwargs else ["weight"]
+
+        window_starts, window_edges, node_sizes = [], [], []
+        for window_start, count_matrix in sliding_window_counts.windows(window, step, start, end):
+            directed_edges_count = count_matrix_to_edge_counts(count_matrix, sliding_window_counts.users)
+            window_starts.append(window_start)
+            window_edges.append(
+                self.directed_edge_counts_to_weighted(directed_edges_count, weight_normalization, **kwargs)
+                if not directed_edges_count.empty
+                else pd.DataFrame(columns=columns, index=directed_edges_count.index)
+            )
+            node_sizes.append(count_matrix.sum(axis=0))
+
+        window_index = pd.DatetimeIndex(window_starts, name="Time")
+        if not window_edges:
+            empty_edges_index = pd.MultiIndex.from_arrays([[], [], []], names=["Time", "Source", "Target"])
+            return (
+                pd.DataFrame(columns=columns, index=empty_edges_index),
+                pd.DataFrame(columns=sliding_window_counts.users, index=window_index),
+            )
+
+        return (
+            pd.concat(window_edges, keys=window_index),
+            pd.DataFrame(node_sizes, index=window_index, columns=sliding_window_counts.users),
         )
 
     @classmethod
@@ -318,6 +625,11 @@ class ChatNetwork(object):
             .count()
         )
 
+        return cls.directed_edge_counts_to_weighted(directed_edges_count, normalization, **kwargs)
+
+    @classmethod
+    @profiled("edge_weighting")
+    def directed_edge_counts_to_weighted(cls, directed_edges_count, normalization="count", **kwargs):
         normalization_columns = kwargs if kwargs else {"weight": normalization}
 
         weighted_edges = []
@@ -329,11 +641,13 @@ class ChatNetwork(object):
                     normalization_type == "MLE_multinomial_distribution_CDF"
                     or normalization_type == "MLE_multinomial_distribution_difference_in_standard_deviations"
             ):
-                expected_directed_edges = cls.get_expected_directed_edges(directed_edges)
+                expected_directed_edges = cls.get_expected_directed_edge_counts(directed_edges_count)
                 deviations = cls.standard_deviations_from_expected_value(directed_edges_count, expected_directed_edges)
                 if normalization_type == "MLE_multinomial_distribution_difference_in_standard_deviations":
                     weight = deviations.rename(column_name)
                 else:
+                    from scipy.stats import norm
+
                     weight = pd.Series(norm.cdf(deviations), index=deviations.index, name=column_name)
 
             elif normalization_type in ("out_edges", "in_edges"):
@@ -355,7 +669,12 @@ class ChatNetwork(object):
 
     @classmethod
     def get_expected_directed_edges(cls, directed_edges):
-        num_edges_by_node = directed_edges["Target"].groupby(directed_edges["Target"]).count()
+        return cls.get_expected_directed_edge_counts(directed_edges.groupby(["Source", "Target"]).size())
+
+    @classmethod
+    @profiled("expected_edges_fit")
+    def get_expected_directed_edge_counts(cls, directed_edges_count):
+        num_edges_by_node = directed_edges_count.groupby(level="Target").sum()
         proportion_edges = num_edges_by_node / num_edges_by_node.sum()
         nodes = proportion_edges.index
         num_nodes = len(nodes)
@@ -367,12 +686,16 @@ class ChatNetwork(object):
         constraints = {'type': 'eq', 'fun': lambda p: p.sum() - 1}
         bounds = ((0, 1),) * num_nodes
 
+        from scipy.optimize import minimize
+
+        iterations = itertools.count(1)
         proportion_estimated = minimize(
             lambda p: optimization_function(p, proportion_edges),
             proportion_edges,
             tol=1e-8,
             constraints=constraints,
-            bounds=bounds
+            bounds=bounds,
+            callback=lambda p: report("optimizer_iteration", iteration=next(iterations)),
         ).x
 
         proportion_estimated = pd.Series(proportion_estimated, index=nodes, name="weight")
@@ -397,6 +720,7 @@ class ChatNetwork(object):
         return deviation
 
     @classmethod
+    @profiled("unite_symmetric_directed_edges")
     def unite_symmetric_directed_edges(cls, directed_edges):
         def unite_edges_subgroup(group):
             nodeA = group["Source"].iloc[0]
@@ -0,0 +1,167 @@
+import contextlib
+import contextvars
+import functools
+import time
+import tracemalloc
+
+import pandas as pd
+
+
+_profile = contextvars.ContextVar("profile", default=None)
+
+
+class StageProfile(object):
+    """Totals of every run of a stage. Peak allocation is the most memory allocated above the start of a run."""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.rows_in = None
+        self.rows_out = None
+        self.peak_allocation = None
+
+    def add_run(self, wall_time, cpu_time, rows_in=None, rows_out=None, peak_allocation=None):
+        self.calls += 1
+        self.wall_time += wall_time
+        self.cpu_time += cpu_time
+        if rows_in is not None:
+            self.rows_in = (self.rows_in or 0) + rows_in
+        if rows_out is not None:
+            self.rows_out = (self.rows_out or 0) + rows_out
+        if peak_allocation is not None:
+            self.peak_allocation = max(self.peak_allocation or 0, peak_allocation)
+
+    def to_dict(self):
+        return {
+            "stage": self.name,
+            "calls": self.calls,
+            "wall_time": self.wall_time,
+            "cpu_time": self.cpu_time,
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "peak_allocation": self.peak_allocation,
+        }
+
+
+class StageRun(object):
+    def __init__(self, rows_in=None):
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.observed_peak = 0
+
+
+class Profile(object):
+    """Stages run inside `profiling()`, in the order they were first run"""
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self._running = []
+
+    @contextlib.contextmanager
+    def stage(self, name, rows_in=None):
+        run = StageRun(rows_in)
+        memory_at_start = self._start_memory_tracking(run)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield run
+        finally:
+            wall_time = time.perf_counter() - wall_start
+            cpu_time = time.process_time() - cpu_start
+            peak_allocation = self._stop_memory_tracking(run, memory_at_start)
+            if name not in self.stages:
+                self.stages[name] = StageProfile(name)
+            self.stages[name].add_run(wall_time, cpu_time, run.rows_in, run.rows_out, peak_allocation)
+
+    def _start_memory_tracking(self, run):
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            # The peak is reset for every stage, so the stages that are still running keep the peak seen so far
+            current, peak = tracemalloc.get_traced_memory()
+            for running in self._running:
+                running.observed_peak = max(running.observed_peak, peak)
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+
+        self._running.append(run)
+        return current if tracing else None
+
+    def _stop_memory_tracking(self, run, memory_at_start):
+        self._running.pop()
+        if memory_at_start is None or not tracemalloc.is_tracing():
+            return None
+
+        peak = max(run.observed_peak, tracemalloc.get_traced_memory()[1])
+        for running in self._running:
+            running.observed_peak = max(running.observed_peak, peak)
+        return peak - memory_at_start
+
+    def to_frame(self):
+        return pd.DataFrame(
+            [stage.to_dict() for stage in self.stages.values()],
+            columns=["stage", "calls", "wall_time", "cpu_time", "rows_in", "rows_out", "peak_allocation"],
+        ).set_index("stage").astype({"rows_in": "Int64", "rows_out": "Int64", "peak_allocation": "Int64"})
+
+    def report(self):
+        frame = self.to_frame()
+        for column in ("wall_time", "cpu_time"):
+            frame[column] = frame[column].map("{:.4f}".format)
+        return frame.astype(object).where(frame.notna(), "-").to_string()
+
+
+@contextlib.contextmanager
+def profiling(trace_memory=False):
+    """Record the wall time, CPU time, rows and (with `trace_memory`) peak allocation of the stages run inside the
+    context"""
+    profile = Profile(trace_memory=trace_memory)
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    token = _profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _profile.reset(token)
+        if started_tracing:
+            tracemalloc.stop()
+
+
+@contextlib.contextmanager
+def stage(name, rows_in=None):
+    profile = _profile.get()
+    if profile is None:
+        yield StageRun(rows_in)
+        return
+
+    with profile.stage(name, rows_in) as run:
+        yield run
+
+
+def _rows(value):
+    if isinstance(value, (pd.Series, pd.DataFrame, list, dict)):
+        return len(value)
+    return None
+
+
+def profiled(name):
+    """Profile each call of the decorated function as the stage `name`. The rows in are those of the first table
+    argument and the rows out those of the result."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            profile = _profile.get()
+            if profile is None:
+                return function(*args, **kwargs)
+
+            rows_in = next((rows for rows in map(_rows, args) if rows is not None), None)
+            with profile.stage(name, rows_in) as run:
+                result = function(*args, **kwargs)
+                run.rows_out = _rows(result)
+            return result
+
+        return wrapper
+
+    return decorator
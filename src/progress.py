@@ -0,0 +1,42 @@
+import contextlib
+import contextvars
+import math
+import time
+
+
+_progress_callback = contextvars.ContextVar("progress_callback", default=None)
+
+
+@contextlib.contextmanager
+def reporting(callback, min_interval=0):
+    """Send the progress reported by the analysis stages run inside the context to `callback(stage, **info)`.
+
+    A report sent less than `min_interval` seconds after the previous one of the same stage is dropped, so stages that
+    report every iteration do not flood the callback.
+    """
+    if min_interval:
+        callback = _throttled(callback, min_interval)
+    token = _progress_callback.set(callback)
+    try:
+        yield
+    finally:
+        _progress_callback.reset(token)
+
+
+def report(stage, **info):
+    callback = _progress_callback.get()
+    if callback is not None:
+        callback(stage, **info)
+
+
+def _throttled(callback, min_interval):
+    last_reported = {}
+
+    def throttled_callback(stage, **info):
+        now = time.monotonic()
+        if now - last_reported.get(stage, -math.inf) < min_interval:
+            return
+        last_reported[stage] = now
+        callback(stage, **info)
+
+    return throttled_callback
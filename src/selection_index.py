@@ -0,0 +1,109 @@
+import itertools
+import json
+
+
+class SelectionIndex(object):
+    """Adjacency between the nodes and edges of a drawn network.
+
+    Nodes and edges are referred to by integer ids: a node id is the position of the node in `nodes` and an edge id
+    is the position of the edge in `edges` (which is also the position of its traces in the edge trace list).
+
+    When the number of traces drawn for each edge is known, the index also locates every trace in a figure whose data
+    are all the edge traces followed by all the node traces.
+    """
+
+    def __init__(self, nodes, edges, edge_trace_counts=None):
+        self.nodes = list(nodes)
+        self.node_ids = {node: node_id for node_id, node in enumerate(self.nodes)}
+        self.edges = [(self.node_ids[source], self.node_ids[target]) for source, target in edges]
+        self.node_edges = [set() for _ in self.nodes]
+        for edge_id, (source_id, target_id) in enumerate(self.edges):
+            self.node_edges[source_id].add(edge_id)
+            self.node_edges[target_id].add(edge_id)
+        self.edge_trace_offsets = (
+            [0] + list(itertools.accumulate(edge_trace_counts)) if edge_trace_counts is not None else None
+        )
+
+    def selected_node_ids(self, selected_nodes):
+        if not selected_nodes:
+            return set()
+
+        return {self.node_ids[node] for node in selected_nodes if node in self.node_ids}
+
+    def visible_edges(self, selected_node_ids):
+        if not selected_node_ids:
+            return set(range(len(self.edges)))
+
+        touched_edges = set().union(*(self.node_edges[node_id] for node_id in selected_node_ids))
+        if len(selected_node_ids) == 1:
+            return touched_edges
+
+        return {
+            edge_id
+            for edge_id in touched_edges
+            if self.edges[edge_id][0] in selected_node_ids and self.edges[edge_id][1] in selected_node_ids
+        }
+
+    def is_edge_visible(self, edge_id, selected_node_ids):
+        if not selected_node_ids:
+            return True
+
+        source_id, target_id = self.edges[edge_id]
+        if len(selected_node_ids) == 1:
+            return source_id in selected_node_ids or target_id in selected_node_ids
+
+        return source_id in selected_node_ids and target_id in selected_node_ids
+
+    def selection_changes(self, previous_selected_nodes, selected_nodes):
+        """Nodes whose selection changed and the new visibility of the edges whose visibility changed, by edge id.
+
+        Only the edges touching a node selected before or after are checked: the rest are hidden under any selection,
+        so they change only when the selection is cleared or started, and then all of them do.
+        """
+        previous_node_ids = self.selected_node_ids(previous_selected_nodes)
+        node_ids = self.selected_node_ids(selected_nodes)
+
+        changed_nodes = previous_node_ids ^ node_ids
+        touched_edges = set().union(*(self.node_edges[node_id] for node_id in previous_node_ids | node_ids))
+        changed_edges = {
+            edge_id: self.is_edge_visible(edge_id, node_ids)
+            for edge_id in touched_edges
+            if self.is_edge_visible(edge_id, previous_node_ids) != self.is_edge_visible(edge_id, node_ids)
+        }
+        if bool(previous_node_ids) != bool(node_ids):
+            changed_edges.update(
+                (edge_id, not node_ids) for edge_id in range(len(self.edges)) if edge_id not in touched_edges
+            )
+
+        return changed_nodes, changed_edges
+
+    def edge_trace_positions(self, edge_id):
+        return range(self.edge_trace_offsets[edge_id], self.edge_trace_offsets[edge_id + 1])
+
+    def node_trace_position(self, node_id):
+        return self.edge_trace_offsets[-1] + node_id
+
+    def to_dict(self):
+        return {
+            "nodes": self.nodes,
+            "edges": [list(edge) for edge in self.edges],
+            "node_edges": [sorted(edge_ids) for edge_ids in self.node_edges],
+            "edge_trace_offsets": self.edge_trace_offsets,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        selection_index = cls.__new__(cls)
+        selection_index.nodes = list(data["nodes"])
+        selection_index.node_ids = {node: node_id for node_id, node in enumerate(selection_index.nodes)}
+        selection_index.edges = [tuple(edge) for edge in data["edges"]]
+        selection_index.node_edges = [set(edge_ids) for edge_ids in data["node_edges"]]
+        selection_index.edge_trace_offsets = data.get("edge_trace_offsets")
+        return selection_index
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def from_json(cls, data):
+        return cls.from_dict(json.loads(data))
@@ -0,0 +1,187 @@
+import numpy as np
+import pandas as pd
+
+
+def transition_users(directed_edges):
+    return pd.Index(pd.concat([directed_edges["Source"], directed_edges["Target"]]).unique()).sort_values()
+
+
+def previous_speakers_matrix(
+        user_codes, num_users, k, decay=0.5, lookback=None, conversation_ids=None, block_size=65536
+):
+    """users x users matrix of the credit every message gives to the `k` previous distinct speakers.
+
+    `user_codes` are the integer codes of the users of the messages. The r-th most recent speaker other than the
+    sender gets decay ** (r - 1), so with k=1 a message credits the previous speaker like a reply count (but a message
+    never credits its own sender). Speakers of more than `lookback` (by default 3k) turns ago, or of another
+    conversation, are not credited.
+
+    Consecutive messages of a user form a turn, and the turns are processed in blocks of `block_size`: a turns x
+    lookback window of the previous speakers is a strided view of the turn users, and its first occurrences are found
+    by a stable sort of every row.
+    """
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    lookback = lookback or 3 * k
+    user_codes = np.asarray(user_codes)
+    matrix = np.zeros(num_users * num_users)
+    if len(user_codes) == 0:
+        return matrix.reshape(num_users, num_users)
+
+    turn_change = user_codes[1:] != user_codes[:-1]
+    if conversation_ids is not None:
+        conversation_ids = np.asarray(conversation_ids)
+        turn_change |= conversation_ids[1:] != conversation_ids[:-1]
+    turn_starts = np.flatnonzero(np.concatenate([[True], turn_change]))
+    turn_users = user_codes[turn_starts]
+    turn_messages = np.diff(np.append(turn_starts, len(user_codes)))
+
+    # Row t of the windows holds the speakers of the turns t - 1, t - 2, ... (-1 before the first turn)
+    previous_users = sliding_window_view(np.concatenate([np.full(lookback, -1), turn_users[:-1]]), lookback)[:, ::-1]
+    if conversation_ids is not None:
+        turn_conversations = conversation_ids[turn_starts]
+        previous_conversations = sliding_window_view(
+            np.concatenate([np.full(lookback, -1), turn_conversations[:-1]]), lookback
+        )[:, ::-1]
+
+    for start in range(0, len(turn_users), block_size):
+        block = slice(start, start + block_size)
+        users = turn_users[block, None]
+        previous = previous_users[block]
+        valid = (previous >= 0) & (previous != users)
+        if conversation_ids is not None:
+            valid &= previous_conversations[block] == turn_conversations[block, None]
+
+        candidates = np.where(valid, previous, num_users)
+        order = np.argsort(candidates, axis=1, kind="stable")
+        sorted_candidates = np.take_along_axis(candidates, order, axis=1)
+        repeated_in_order = np.zeros_like(valid)
+        repeated_in_order[:, 1:] = sorted_candidates[:, 1:] == sorted_candidates[:, :-1]
+        repeated = np.empty_like(valid)
+        np.put_along_axis(repeated, order, repeated_in_order, axis=1)
+
+        first_occurrence = valid & ~repeated
+        rank = np.cumsum(first_occurrence, axis=1)
+        credited = first_occurrence & (rank <= k)
+        weights = decay ** (rank - 1.0) * turn_messages[block, None]
+        matrix += np.bincount(
+            (users * num_users + previous)[credited], weights=weights[credited], minlength=num_users * num_users
+        )
+
+    return matrix.reshape(num_users, num_users)
+
+
+def count_matrix_to_edge_counts(count_matrix, users):
+    """Non-zero reply counts of a users x users matrix, like the counts that `ChatNetwork.directed_edges_to_weighted`
+    weights"""
+    source_ids, target_ids = np.nonzero(count_matrix)
+    return pd.Series(
+        count_matrix[source_ids, target_ids],
+        index=pd.MultiIndex.from_arrays([users[source_ids], users[target_ids]], names=["Source", "Target"]),
+        name="index",
+    )
+
+
+class TransitionIndex(object):
+    """Prefix sums of the reply counts of every pair of users that replied to each other, bucketed by time.
+
+    Only the (pair, bucket) cells with replies are kept, sorted by pair and bucket (only buckets with messages exist),
+    with the number of replies of the pair up to the end of the bucket. The counts of a pair in any [start, end)
+    window are the difference of the prefix sums before both ends, found by a binary search, so the index takes
+    memory proportional to the replies instead of buckets x users x users.
+    """
+
+    def __init__(self, directed_edges, freq="D"):
+        self.freq = freq
+        self.users = transition_users(directed_edges)
+
+        bucket_starts = directed_edges["Time"].dt.floor(freq)
+        self.buckets = pd.DatetimeIndex(bucket_starts.unique()).sort_values()
+
+        pair_ids = (
+            self.users.get_indexer(directed_edges["Source"]).astype(np.int64) * len(self.users)
+            + self.users.get_indexer(directed_edges["Target"])
+        )
+        # Key of the cells: pair id x (buckets + 1) + bucket, so that the position of a window end is also a key
+        self.cell_keys, cell_counts = np.unique(
+            pair_ids * (len(self.buckets) + 1) + self.buckets.get_indexer(bucket_starts), return_counts=True
+        )
+        self.pairs, self.pair_starts = np.unique(self.cell_keys // (len(self.buckets) + 1), return_index=True)
+        pair_cells = np.diff(np.append(self.pair_starts, len(self.cell_keys)))
+        cumulative_counts = np.cumsum(cell_counts)
+        counts_before_pair = cumulative_counts[self.pair_starts] - cell_counts[self.pair_starts]
+        self.cumulative_counts = cumulative_counts - np.repeat(counts_before_pair, pair_cells)
+
+    def _bucket_position(self, time, default):
+        if time is None:
+            return default
+        return self.buckets.searchsorted(pd.Timestamp(time).floor(self.freq), side="left")
+
+    def _counts_before(self, bucket_position):
+        """Replies of every pair in the buckets before `bucket_position`"""
+        last_cells = np.searchsorted(
+            self.cell_keys, self.pairs * (len(self.buckets) + 1) + bucket_position, side="left"
+        ) - 1
+        return np.where(last_cells >= self.pair_starts, self.cumulative_counts[last_cells], 0)
+
+    def pair_counts(self, start=None, end=None):
+        """Reply counts of every pair of `pairs` (source id x users + target id) in the buckets from the one of `start`
+        up to the one of `end`, excluded"""
+        start_position = self._bucket_position(start, 0)
+        end_position = max(self._bucket_position(end, len(self.buckets)), start_position)
+        return self._counts_before(end_position) - self._counts_before(start_position)
+
+    def count_matrix(self, start=None, end=None):
+        """users x users matrix of the `pair_counts`"""
+        matrix = np.zeros(len(self.users) * len(self.users), dtype=np.int64)
+        matrix[self.pairs] = self.pair_counts(start, end)
+        return matrix.reshape(len(self.users), len(self.users))
+
+    def edge_counts(self, start=None, end=None):
+        pair_counts = self.pair_counts(start, end)
+        replied = pair_counts > 0
+        source_ids, target_ids = np.divmod(self.pairs[replied], len(self.users))
+        return pd.Series(
+            pair_counts[replied],
+            index=pd.MultiIndex.from_arrays(
+                [self.users[source_ids], self.users[target_ids]], names=["Source", "Target"]
+            ),
+            name="index",
+        )
+
+
+class SlidingWindowCounts(object):
+    """Reply counts between every pair of users in a window that slides over the chat.
+
+    Moving the window one step adds the replies that enter it and subtracts the ones that leave it, so sliding over
+    the whole chat costs O(replies + windows x users x users) instead of recounting every window.
+    """
+
+    def __init__(self, directed_edges):
+        directed_edges = directed_edges.sort_values("Time", kind="mergesort")
+        self.users = transition_users(directed_edges)
+        self.times = pd.DatetimeIndex(directed_edges["Time"])
+        self.pair_ids = (
+            self.users.get_indexer(directed_edges["Source"]) * len(self.users)
+            + self.users.get_indexer(directed_edges["Target"])
+        )
+
+    def windows(self, window, step, start=None, end=None):
+        """Yield the start of every [start, start + window) window and its users x users reply counts"""
+        window = pd.to_timedelta(window)
+        step = pd.to_timedelta(step)
+        if len(self.times) == 0:
+            return
+        start = pd.Timestamp(start) if start is not None else self.times[0].floor("D")
+        end = pd.Timestamp(end) if end is not None else self.times[-1]
+
+        num_pairs = len(self.users) ** 2
+        counts = np.zeros(num_pairs, dtype=np.int64)
+        entered = left = 0
+        for window_start in pd.date_range(start, end, freq=step):
+            enter = self.times.searchsorted(window_start + window, side="left")
+            leave = self.times.searchsorted(window_start, side="left")
+            counts += np.bincount(self.pair_ids[entered:enter], minlength=num_pairs)
+            counts -= np.bincount(self.pair_ids[left:leave], minlength=num_pairs)
+            entered, left = enter, leave
+            yield window_start, counts.reshape(len(self.users), len(self.users)).copy()
@@ -1,22 +1,32 @@
+import codecs
+import heapq
 import re
 
 import pandas as pd
 
+from src.profiling import profiled
+from src.progress import report
+
 
 MESSAGE_COMPONENTS = ["Time", "User", "Message"]
 HEADER_LINES = 3
+FIRST_LINE_OF_MESSAGE_REGEX = re.compile(".* - .*: ")
 
 
+@profiled("read_chat")
 def read_chat(chat_file_name=None, chat_file=None, collapse=True):
     chat_lines = raw_chat_to_lines(chat_file_name, chat_file)
+    report("lines_read", lines=len(chat_lines))
     chat_messages = lines_to_messages(chat_lines)
     chat_components = messages_to_components(chat_messages)
     chat = clean_chat_components(chat_components)
     if collapse:
         chat = collapse_same_user_messages(chat)
+    report("messages_found", messages=len(chat))
     return chat
 
 
+@profiled("read_lines")
 def raw_chat_to_lines(chat_file_name=None, chat_file=None):
     if chat_file_name:
         with open(chat_file_name, "r", encoding="utf8") as f:
@@ -25,15 +35,17 @@ def raw_chat_to_lines(chat_file_name=None, chat_file=None):
     return pd.Series(chat_file.readlines()[HEADER_LINES:])
 
 
+@profiled("lines_to_messages")
 def lines_to_messages(chat_lines):
     def is_first_line_of_message(chat_lines):
-        return chat_lines.str.match(".* - .*: ")
+        return chat_lines.str.match(FIRST_LINE_OF_MESSAGE_REGEX.pattern)
 
     is_first_line = is_first_line_of_message(chat_lines)
     message_index = is_first_line.cumsum()
     return chat_lines.groupby(message_index).agg(lambda group: group.str.cat())
 
 
+@profiled("messages_to_components")
 def messages_to_components(chat_messages):
     time_regex = r"\d{1,4}/\d{1,2}/\d{1,2} \d{1,2}:\d{2}"
     user_regex = r".*"
@@ -42,6 +54,7 @@ def messages_to_components(chat_messages):
     return chat_messages.str.extract(regex, flags=re.DOTALL)
 
 
+@profiled("clean_chat_components")
 def clean_chat_components(chat_components):
     chat_components["Time"] = chat_components["Time"].astype("datetime64")
     chat_components["Message"] = chat_components["Message"].str.strip()
@@ -49,6 +62,7 @@ def clean_chat_components(chat_components):
     return chat_components
 
 
+@profiled("collapse_same_user_messages")
 def collapse_same_user_messages(chat):
     change_user = (chat["User"] != chat["User"].shift(1)).fillna(True)
     message_index = change_user.cumsum().rename(None)
@@ -59,3 +73,136 @@ def collapse_same_user_messages(chat):
             "Message": lambda group: group.str.cat(sep="\n"),
         }
     )
+
+
+@profiled("merge_chats")
+def merge_chats(chats, collapse=True):
+    """Merge exports of the same chat taken from different phones into one chat.
+
+    Read the exports with `collapse=False`, so that a message missing from one of them does not change how the others
+    are collapsed. A message is identified by its time, user and text hash, plus how many times the same message was
+    already sent in that minute, so repeated messages are kept as many times as the export with most of them has.
+    The exports are already in chronological order, so the kept messages are merged with a k-way merge instead of
+    being sorted again. Messages of the same minute keep the order of the first export that has them.
+
+    Returns the merged chat and its conflicts: the messages of every (time, user) that at least two exports have, but
+    with different texts (deleted or edited messages, for instance). The merged chat keeps all of them.
+    """
+    keys = ["Time", "User", "TextHash"]
+    messages = pd.concat(
+        [
+            chat[MESSAGE_COMPONENTS].assign(
+                Export=export, TextHash=pd.util.hash_pandas_object(chat["Message"], index=False).values
+            )
+            for export, chat in enumerate(chats)
+        ],
+        ignore_index=True,
+    )
+    messages["Occurrence"] = messages.groupby(keys + ["Export"]).cumcount()
+
+    exports_with_text = messages.groupby(keys)["Export"].transform("nunique")
+    exports_with_slot = messages.groupby(["Time", "User"])["Export"].transform("nunique")
+    conflicting_slot = (
+        (exports_with_slot > 1) & (exports_with_text < exports_with_slot)
+    ).groupby([messages["Time"], messages["User"]]).transform("any")
+    conflicts = (
+        messages.loc[conflicting_slot, ["Time", "User", "Export", "Message"]]
+        .sort_values(["Time", "User", "Export"], kind="mergesort")
+        .reset_index(drop=True)
+    )
+
+    kept_messages = messages.drop_duplicates(keys + ["Occurrence"])
+    # (time, position) of the messages of every export, ties in time are merged in the order of the exports
+    export_timelines = [
+        zip(export_messages["Time"].to_numpy(), export_messages.index)
+        for _, export_messages in kept_messages.groupby("Export")
+    ]
+    merged_positions = [position for _, position in heapq.merge(*export_timelines)]
+    chat = kept_messages.loc[merged_positions, MESSAGE_COMPONENTS].reset_index(drop=True)
+    chat.index += 1
+    report("chats_merged", chats=len(chats), messages=len(chat), conflicts=len(conflicts))
+    if collapse:
+        chat = collapse_same_user_messages(chat)
+    return chat, conflicts
+
+
+class ChatParser(object):
+    """Incremental version of `read_chat` for chat exports that arrive in chunks of bytes.
+
+    Messages are split and their components extracted (in batches of `batch_size` messages) while the chunks are fed,
+    so that `close` only needs to clean and collapse the message table.
+    """
+
+    def __init__(self, collapse=True, batch_size=10000):
+        self.collapse = collapse
+        self.batch_size = batch_size
+        self.bytes_parsed = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._partial_line = ""
+        self._header_lines_left = HEADER_LINES
+        self._message_id = 0
+        self._message_lines = []
+        self._batch_messages = []
+        self._batch_message_ids = []
+        self._components = []
+
+    def feed(self, chunk):
+        self.bytes_parsed += len(chunk)
+        self._feed_text(self._decoder.decode(chunk))
+        report("bytes_parsed", bytes=self.bytes_parsed)
+
+    def close(self):
+        self._feed_text(self._decoder.decode(b"", final=True))
+        if self._partial_line:
+            self._add_line(self._partial_line)
+            self._partial_line = ""
+        self._end_message()
+        self._extract_batch()
+
+        chat_components = (
+            pd.concat(self._components)
+            if self._components
+            else messages_to_components(pd.Series([], dtype=object))
+        )
+        chat = clean_chat_components(chat_components)
+        if self.collapse:
+            chat = collapse_same_user_messages(chat)
+        report("messages_found", messages=len(chat))
+        return chat
+
+    def _feed_text(self, text):
+        lines = (self._partial_line + text).split("\n")
+        self._partial_line = lines.pop()
+        for line in lines:
+            self._add_line(line + "\n")
+
+    def _add_line(self, line):
+        if self._header_lines_left:
+            self._header_lines_left -= 1
+            return
+
+        if FIRST_LINE_OF_MESSAGE_REGEX.match(line):
+            self._end_message()
+            self._message_id += 1
+
+        self._message_lines.append(line)
+
+    def _end_message(self):
+        if not self._message_lines:
+            return
+
+        self._batch_messages.append("".join(self._message_lines))
+        self._batch_message_ids.append(self._message_id)
+        self._message_lines = []
+        if len(self._batch_messages) >= self.batch_size:
+            self._extract_batch()
+
+    def _extract_batch(self):
+        if not self._batch_messages:
+            return
+
+        self._components.append(
+            messages_to_components(pd.Series(self._batch_messages, index=self._batch_message_ids))
+        )
+        self._batch_messages = []
+        self._batch_message_ids = []
@@ -0,0 +1,71 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+from pandas._testing import assert_frame_equal, assert_series_equal
+
+from src.activity_cube import ActivityCube
+
+
+class ActivityCubeTests(unittest.TestCase):
+    def setUp(self):
+        self.chat = pd.DataFrame(
+            {
+                "Time": pd.to_datetime(
+                    [
+                        "2020-10-05 19:00",
+                        "2020-10-05 19:01",
+                        "2020-10-06 10:00",
+                        "2020-12-08 12:00",
+                        "2020-12-08 12:05",
+                        "2020-12-09 19:30",
+                    ]
+                ),
+                "User": ["Valen", "Bowen", "Ale", "Bowen", "Ale", "Valen"],
+                "Message": ["Hola", "Ciao", "Que mais", "Bien and you?", "Muy bieeen", "Genial"],
+            },
+        )
+        self.activity_cube = ActivityCube.from_chat(self.chat)
+
+    def test_months_without_messages_are_in_the_cube(self):
+        # Given
+        expected_months = pd.period_range("2020-10", "2020-12", freq="M", name="Month")
+        # Then
+        self.assertEqual((3, 24, 7, 3), self.activity_cube.counts.shape)
+        pd.testing.assert_index_equal(expected_months, self.activity_cube.months)
+
+    def test_rollups_match_the_groupbys_of_the_chat(self):
+        # Given
+        times = self.chat["Time"].dt
+        expected_user_months = (
+            self.chat.groupby([times.to_period("M"), "User"]).size().unstack(fill_value=0)
+            .reindex(self.activity_cube.months, fill_value=0)
+        )
+        expected_hours = self.chat.groupby(times.hour).size().reindex(range(24), fill_value=0)
+        # When
+        user_months = self.activity_cube.rollup("month", "user")
+        hours = self.activity_cube.rollup("hour")
+        # Then
+        assert_frame_equal(expected_user_months, user_months, check_names=False)
+        assert_series_equal(expected_hours, hours, check_names=False, check_index_type=False)
+        self.assertEqual(len(self.chat), self.activity_cube.rollup())
+
+    def test_rollup_of_a_slice(self):
+        # When
+        weekday_hours = self.activity_cube.rollup("weekday", "hour", users=["Valen"], months=["2020-12"])
+        # Then
+        self.assertEqual(1, weekday_hours.values.sum())
+        self.assertEqual(1, weekday_hours.loc["Wednesday", 19])
+
+    def test_unknown_selections_and_dimensions_are_rejected(self):
+        with self.assertRaises(KeyError):
+            self.activity_cube.rollup("hour", users=["Nobody"])
+        with self.assertRaises(ValueError):
+            self.activity_cube.rollup("minute")
+
+    def test_empty_chat(self):
+        # When
+        activity_cube = ActivityCube.from_chat(self.chat.iloc[:0])
+        # Then
+        self.assertEqual(0, activity_cube.rollup())
+        np.testing.assert_array_equal(np.zeros(24), activity_cube.rollup("hour").values)
@@ -0,0 +1,49 @@
+import time
+import unittest
+
+from web_analyzer.analysis_executor import AnalysisExecutor, AnalysisExecutorBusy, AnalysisTimeout
+
+
+class AnalysisExecutorTests(unittest.TestCase):
+    def setUp(self):
+        self.executor = None
+
+    def tearDown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def test_run_job_in_worker_process(self):
+        # Given
+        self.executor = AnalysisExecutor(max_workers=1, max_queued=0)
+        # When
+        future = self.executor.submit(pow, 2, 10)
+        # Then
+        self.assertEqual(1024, future.result())
+
+    def test_reject_job_when_workers_and_queue_are_full(self):
+        # Given
+        self.executor = AnalysisExecutor(max_workers=1, max_queued=1)
+        self.executor.submit(time.sleep, 1)
+        self.executor.submit(time.sleep, 0)
+        # When / Then
+        with self.assertRaises(AnalysisExecutorBusy):
+            self.executor.submit(time.sleep, 0)
+
+    def test_abort_job_after_timeout(self):
+        # Given
+        self.executor = AnalysisExecutor(max_workers=1, max_queued=0, timeout=1)
+        # When
+        future = self.executor.submit(time.sleep, 10)
+        # Then
+        with self.assertRaises(AnalysisTimeout):
+            future.result()
+
+    def test_call_on_done_callback_with_the_finished_job(self):
+        # Given
+        self.executor = AnalysisExecutor(max_workers=1, max_queued=0)
+        finished_jobs = []
+        # When
+        self.executor.submit(pow, 2, 10, on_done=lambda future: finished_jobs.append(future.result()))
+        self.executor.shutdown()
+        # Then
+        self.assertEqual([1024], finished_jobs)
@@ -0,0 +1,116 @@
+import contextlib
+import io
+import os
+from pathlib import Path
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+from pandas._testing import assert_frame_equal
+
+from src import batch, whatsapp
+from src.chat_network import ChatNetwork
+
+try:
+    import pyarrow  # noqa: F401
+except ImportError:
+    pyarrow = None
+
+
+@unittest.skipUnless(pyarrow, "pyarrow is needed to write Parquet and Feather tables")
+class BatchTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.exports_directory = os.path.join(self.directory, "exports")
+        self.output_directory = os.path.join(self.directory, "tables")
+        os.makedirs(os.path.join(self.exports_directory, "group"))
+        shutil.copy("tests/helpers/ChatExample.txt", self.exports_directory)
+        shutil.copy("tests/helpers/ChatExampleSplitLines.txt", os.path.join(self.exports_directory, "group"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_write_edge_and_node_tables_of_every_chat_in_a_directory(self):
+        # Given
+        chat = whatsapp.read_chat("tests/helpers/ChatExample.txt")
+        expected_edges, expected_nodes = ChatNetwork(chat=chat).get_statistics()
+        # When
+        exit_code = batch.main([self.exports_directory, "--output", self.output_directory, "--workers", "2"])
+        # Then
+        self.assertEqual(0, exit_code)
+        assert_frame_equal(
+            expected_edges, pd.read_parquet(os.path.join(self.output_directory, "ChatExample.edges.parquet"))
+        )
+        assert_frame_equal(
+            expected_nodes, pd.read_parquet(os.path.join(self.output_directory, "ChatExample.nodes.parquet"))
+        )
+        self.assertTrue(Path(self.output_directory, "group", "ChatExampleSplitLines.edges.parquet").is_file())
+
+    def test_skip_chats_that_were_already_analysed(self):
+        # Given
+        batch.main([self.exports_directory, "--output", self.output_directory, "--format", "feather"])
+        log = []
+        # When
+        failed = batch.analyse_chat_exports(
+            batch.find_chat_exports([os.path.join(self.exports_directory, "**", "*.txt")]),
+            self.exports_directory,
+            self.output_directory,
+            "feather",
+            log=log.append,
+        )
+        # Then
+        self.assertEqual([], failed)
+        self.assertEqual(2, len(log))
+        self.assertTrue(all(message.startswith("Skipping") for message in log))
+
+    def test_keep_the_layout_under_the_input_directory_whatever_the_pattern_matches(self):
+        # When
+        batch.main([os.path.join(self.exports_directory, "**", "*SplitLines.txt"), "--output", self.output_directory])
+        # Then
+        self.assertTrue(Path(self.output_directory, "group", "ChatExampleSplitLines.edges.parquet").is_file())
+
+    def test_keep_the_layout_under_the_given_root(self):
+        # When
+        batch.main(
+            [
+                os.path.join(self.exports_directory, "group"),
+                "--root",
+                self.directory,
+                "--output",
+                self.output_directory,
+            ]
+        )
+        # Then
+        self.assertTrue(
+            Path(self.output_directory, "exports", "group", "ChatExampleSplitLines.edges.parquet").is_file()
+        )
+
+    def test_reject_exports_outside_the_given_root(self):
+        # Given
+        stderr = io.StringIO()
+        # When
+        with self.assertRaises(SystemExit) as exit_context, contextlib.redirect_stderr(stderr):
+            batch.main(
+                [
+                    self.exports_directory,
+                    "--root",
+                    os.path.join(self.exports_directory, "group"),
+                    "--output",
+                    self.output_directory,
+                ]
+            )
+        # Then
+        self.assertEqual(2, exit_context.exception.code)
+        self.assertIn("ChatExample.txt is not under the root directory", stderr.getvalue())
+        self.assertFalse(Path(self.output_directory).exists())
+
+    def test_report_chats_that_could_not_be_analysed(self):
+        # Given
+        shutil.copy("tests/helpers/ChatExampleWrong.PNG", os.path.join(self.exports_directory, "Wrong.txt"))
+        # When
+        exit_code = batch.main([self.exports_directory, "--output", self.output_directory])
+        # Then
+        self.assertEqual(1, exit_code)
+        self.assertFalse(Path(self.output_directory, "Wrong.edges.parquet").exists())
+        self.assertTrue(Path(self.output_directory, "ChatExample.edges.parquet").is_file())
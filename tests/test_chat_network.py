@@ -1,10 +1,14 @@
+import subprocess
+import sys
 import unittest
 
 import pandas as pd
 from pandas._testing import assert_frame_equal, assert_series_equal
 import plotly.graph_objects as go
 
-from src.chat_network import ChatNetwork
+from src import progress
+from src.chat_network import ChatNetwork, LAZY_MODULES
+from src.selection_index import SelectionIndex
 
 
 class ChatNetworkTests(unittest.TestCase):
@@ -343,13 +347,14 @@ class ChatNetworkTests(unittest.TestCase):
             ),
         ]
 
-        edge_traces = {
-            "user1:user2": ["trace1", "trace2"],
-            "user1:user3": ["trace3", "trace4"],
-        }
+        edge_traces = [
+            ["trace1", "trace2"],
+            ["trace3", "trace4"],
+        ]
+        selection_index = SelectionIndex(["user1", "user2", "user3"], [("user1", "user2"), ("user1", "user3")])
 
         # When
-        node_traces, edge_traces = ChatNetwork.filter_traces(node_traces, edge_traces, None)
+        node_traces, edge_traces = ChatNetwork.filter_traces(node_traces, edge_traces, selection_index, None)
         # Then
         self.assertEqual(expected_filtered_node_traces, node_traces)
         self.assertEqual(["trace1", "trace2", "trace3", "trace4"], edge_traces)
@@ -410,11 +415,14 @@ class ChatNetworkTests(unittest.TestCase):
             ),
         ]
 
-        edge_traces = {
-            "does_not_matter:doesnotmatter": ["trace1", "trace2"],
-        }
+        edge_traces = [
+            ["trace1", "trace2"],
+        ]
+        selection_index = SelectionIndex(["user1", "user2", "user3"], [("user1", "user2")])
         # When
-        node_traces_filtered, _ = ChatNetwork.filter_traces(node_traces, edge_traces, ["user1", "user3"])
+        node_traces_filtered, _ = ChatNetwork.filter_traces(
+            node_traces, edge_traces, selection_index, ["user1", "user3"]
+        )
         # Then
         self.assertEqual(expected_filtered_node_traces, node_traces_filtered)
 
@@ -430,13 +438,19 @@ class ChatNetworkTests(unittest.TestCase):
                 },
             ),
         }
-        edge_traces = {
-            "user3:user1": ["trace3", "trace4"],
-            "user1:user4": ["trace1", "trace2"],
-            "user2:user3": ["trace5", "trace6"],
-        }
+        edge_traces = [
+            ["trace3", "trace4"],
+            ["trace1", "trace2"],
+            ["trace5", "trace6"],
+        ]
+        selection_index = SelectionIndex(
+            ["user1", "user2", "user3", "user4"],
+            [("user3", "user1"), ("user1", "user4"), ("user2", "user3")],
+        )
         # When
-        _, edge_traces = ChatNetwork.filter_traces(node_traces, edge_traces, ["user1", "user3", "user2"])
+        _, edge_traces = ChatNetwork.filter_traces(
+            node_traces, edge_traces, selection_index, ["user1", "user3", "user2"]
+        )
         # Then
         self.assertEqual(["trace3", "trace4", "trace5", "trace6"], edge_traces)
 
@@ -496,14 +510,20 @@ class ChatNetworkTests(unittest.TestCase):
             ),
         ]
 
-        edge_traces = {
-            "user3:user1": ["trace3", "trace4"],
-            "user1:user2": ["trace1", "trace2"],
-            "user2:user3": ["trace5", "trace6"],
-        }
+        edge_traces = [
+            ["trace3", "trace4"],
+            ["trace1", "trace2"],
+            ["trace5", "trace6"],
+        ]
+        selection_index = SelectionIndex(
+            ["user1", "user2", "user3"],
+            [("user3", "user1"), ("user1", "user2"), ("user2", "user3")],
+        )
 
         # When
-        node_traces_filtered, edge_traces_filtered = ChatNetwork.filter_traces(node_traces, edge_traces, ["user2"])
+        node_traces_filtered, edge_traces_filtered = ChatNetwork.filter_traces(
+            node_traces, edge_traces, selection_index, ["user2"]
+        )
         # Then
         self.assertEqual(expected_filtered_node_traces, node_traces_filtered)
         self.assertEqual(["trace1", "trace2", "trace5", "trace6"], edge_traces_filtered)
@@ -530,3 +550,258 @@ class ChatNetworkTests(unittest.TestCase):
         chat_network.chat = chat
         # Then
         self.assertEqual(["Valen", "Bowen", "Ale"], chat_network.get_nodes())
+
+    def test_filter_traces_does_not_mutate_node_traces(self):
+        # Given
+        node_traces = {
+            "user1": {"marker": {"opacity": 1}},
+            "user2": {"marker": {"opacity": 1}},
+        }
+        selection_index = SelectionIndex(["user1", "user2"], [("user1", "user2")])
+        # When
+        node_traces_filtered, _ = ChatNetwork.filter_traces(node_traces, [["trace1"]], selection_index, ["user1"])
+        # Then
+        self.assertEqual([{"marker": {"opacity": 1}}, {"marker": {"opacity": 0.5}}], node_traces_filtered)
+        self.assertEqual({"marker": {"opacity": 1}}, node_traces["user2"])
+
+    def test_draw_network_traces_survive_json_round_trip(self):
+        # Given
+        network_chat = ChatNetwork(self.WHATSAPP_EXPORT_NAME)
+        _, node_traces, edge_traces, selection_index = network_chat.draw(return_traces=True)
+        # When
+        node_traces_loaded, edge_traces_loaded, selection_index = ChatNetwork.traces_from_json(
+            node_traces, edge_traces, selection_index
+        )
+        # Then
+        self.assertEqual(list(node_traces_loaded.keys()), selection_index.nodes)
+        self.assertEqual(len(edge_traces_loaded), len(selection_index.edges))
+
+    def test_figure_selection_delta_locates_changed_traces_in_figure(self):
+        # Given
+        selection_index = SelectionIndex(
+            ["user1", "user2", "user3"],
+            [("user3", "user1"), ("user1", "user2"), ("user2", "user3")],
+            edge_trace_counts=[2, 2, 2],
+        )
+        # When
+        delta = ChatNetwork.figure_selection_delta(selection_index, [], ["user2"])
+        # Then
+        self.assertEqual({0: False, 1: False}, delta["visible"])
+        self.assertEqual({7: 1}, delta["opacity"])
+
+    def test_draw_keeps_hidden_edge_traces_in_figure(self):
+        # Given
+        network_chat = ChatNetwork(self.WHATSAPP_EXPORT_NAME)
+        _, node_traces, edge_traces, selection_index = network_chat.draw(return_traces=True)
+        # When
+        figure = ChatNetwork().draw(
+            node_traces=node_traces,
+            edge_traces=edge_traces,
+            selection_index=selection_index,
+            selected_nodes=["Rubén"],
+        )
+        # Then
+        edge_trace_count = SelectionIndex.from_json(selection_index).edge_trace_offsets[-1]
+        self.assertEqual(edge_trace_count + 3, len(figure.data))
+
+    def test_draw_reports_progress_of_each_stage(self):
+        # Given
+        stages = []
+        # When
+        with progress.reporting(lambda stage, **info: stages.append(stage)):
+            ChatNetwork(self.WHATSAPP_EXPORT_NAME).draw()
+        # Then
+        self.assertEqual(["lines_read", "messages_found"], stages[:2])
+        self.assertIn("optimizer_iteration", stages)
+        self.assertEqual("traces_built", stages[-1])
+
+    def test_progress_reports_of_the_same_stage_are_throttled(self):
+        # Given
+        stages = []
+        # When
+        with progress.reporting(lambda stage, **info: stages.append(stage), min_interval=60):
+            ChatNetwork(self.WHATSAPP_EXPORT_NAME).draw()
+        # Then
+        self.assertEqual(1, stages.count("optimizer_iteration"))
+        self.assertEqual("traces_built", stages[-1])
+
+    def test_get_node_statistics(self):
+        # Given
+        chat = pd.DataFrame(
+            {
+                "Time": pd.to_datetime(["2020-10-05 19:00", "2020-10-05 19:01", "2020-10-05 19:02"]),
+                "User": ["Valen", "Bowen", "Valen"],
+                "Message": ["Hola", "Ciao", "Que tal"],
+            },
+        )
+        expected_nodes = pd.DataFrame(
+            {
+                "node": ["Valen", "Bowen"],
+                "messages": [2, 1],
+                "replies_received": [1, 1],
+                "replies_received_share": [0.5, 0.5],
+            },
+        )
+        # When
+        _, nodes = ChatNetwork(chat=chat).get_statistics()
+        # Then
+        assert_frame_equal(expected_nodes, nodes)
+
+    def test_import_does_not_load_drawing_and_weighting_libraries(self):
+        # Given
+        code = "import sys; import src.chat_network; print(' '.join(sorted(sys.modules)))"
+        # When
+        modules = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+        # Then
+        self.assertEqual([], [module for module in LAZY_MODULES if module in modules.split()])
+
+    def test_get_reply_latency_statistics_of_edges_and_users(self):
+        # Given
+        chat = pd.DataFrame(
+            {
+                "Time": pd.to_datetime(
+                    [
+                        "2020-10-05 19:00",
+                        "2020-10-05 19:01",
+                        "2020-10-05 19:03",
+                        "2020-10-05 19:13",
+                        "2020-10-05 20:13",
+                        "2020-10-05 20:14",
+                    ]
+                ),
+                "User": ["Valen", "Bowen", "Valen", "Bowen", "Valen", "Valen"],
+                "Message": ["Hola", "Ciao", "Que tal", "Bien", "Genial", "Adiós"],
+            },
+        )
+        bins = ("0s", "5min", "1h")
+        expected_edge_statistics = pd.DataFrame(
+            {
+                "replies": [2, 2],
+                "median": [330.0, 1860.0],
+                "0s-5min": [1, 1],
+                "5min-1h": [1, 0],
+                "1h+": [0, 1],
+            },
+            index=pd.MultiIndex.from_tuples([("Bowen", "Valen"), ("Valen", "Bowen")], names=["Source", "Target"]),
+        )
+        # When
+        chat_network = ChatNetwork(chat=chat)
+        edge_statistics = chat_network.get_reply_latency_statistics(quantiles=[0.5], bins=bins)
+        user_statistics = chat_network.get_reply_latency_statistics(by="user", quantiles=[0.5, 0.9], bins=bins)
+        # Then
+        assert_frame_equal(expected_edge_statistics, edge_statistics, check_dtype=False)
+        self.assertEqual(["Bowen", "Valen"], list(user_statistics.index))
+        self.assertEqual({"Bowen": 546.0, "Valen": 3252.0}, user_statistics["p90"].to_dict())
+
+    def test_get_directed_edges_weighted_by_reply_latency(self):
+        # Given
+        chat = pd.DataFrame(
+            {
+                "Time": pd.to_datetime(["2020-10-05 19:00", "2020-10-05 19:01", "2020-10-05 19:03"]),
+                "User": ["Valen", "Bowen", "Valen"],
+                "Message": ["Hola", "Ciao", "Que tal"],
+            },
+        )
+        expected_edges = pd.DataFrame(
+            {"count": [1, 1], "latency": [60.0, 120.0]},
+            index=pd.MultiIndex.from_tuples([("Bowen", "Valen"), ("Valen", "Bowen")], names=["Source", "Target"]),
+        )
+        # When
+        edges = ChatNetwork(chat=chat).get_directed_edges(
+            count="count", latency=ChatNetwork.NORMALIZATION_TYPE_MEDIAN_REPLY_LATENCY
+        )
+        # Then
+        assert_frame_equal(expected_edges, edges)
+
+    def test_reply_latency_is_measured_from_the_last_message_of_the_replied_turn(self):
+        # Given
+        ana_times = pd.date_range("2020-10-05 10:00", "2020-10-05 12:55", freq="5min")
+        chat = pd.DataFrame(
+            {
+                "Time": ana_times.append(pd.DatetimeIndex(["2020-10-05 13:01"])),
+                "User": ["Ana"] * len(ana_times) + ["Bob"],
+                "Message": ["Hola"] * len(ana_times) + ["Ciao"],
+            },
+            index=range(1, len(ana_times) + 2),
+        )
+        # When
+        latencies = ChatNetwork(chat=chat).get_reply_latencies()
+        # Then
+        self.assertEqual([pd.Timedelta("6min")], list(latencies["Latency"]))
+
+    def test_cut_chat_in_conversations_and_drop_replies_across_them(self):
+        # Given
+        chat = pd.DataFrame(
+            {
+                "Time": pd.to_datetime(
+                    [
+                        "2020-10-05 19:00",
+                        "2020-10-05 19:01",
+                        "2020-10-05 19:03",
+                        "2020-10-08 10:00",
+                        "2020-10-08 10:02",
+                    ]
+                ),
+                "User": ["Valen", "Bowen", "Valen", "Ale", "Valen"],
+                "Message": ["Hola", "Ciao", "Que tal", "Buenas", "Hey"],
+            },
+        )
+        expected_conversations = pd.DataFrame(
+            {
+                "start": pd.to_datetime(["2020-10-05 19:00", "2020-10-08 10:00"]),
+                "end": pd.to_datetime(["2020-10-05 19:03", "2020-10-08 10:02"]),
+                "duration": pd.to_timedelta(["3min", "2min"]),
+                "messages": [3, 2],
+                "participants": [2, 2],
+                "initiator": ["Valen", "Ale"],
+            },
+            index=pd.Index([1, 2], name="Conversation"),
+        )
+        expected_edges = pd.DataFrame(
+            {"weight": [1, 1, 1]},
+            index=pd.MultiIndex.from_tuples(
+                [("Bowen", "Valen"), ("Valen", "Ale"), ("Valen", "Bowen")], names=["Source", "Target"]
+            ),
+        )
+        # When
+        chat_network = ChatNetwork(chat=chat, conversation_gap="1D")
+        conversations = chat_network.get_conversation_statistics()
+        edges = chat_network.get_directed_edges("count")
+        # Then
+        assert_frame_equal(expected_conversations, conversations, check_dtype=False)
+        assert_frame_equal(expected_edges, edges, check_dtype=False)
+
+    def test_a_long_turn_is_not_a_silence_between_conversations(self):
+        # Given
+        ana_times = pd.date_range("2020-10-05 10:00", "2020-10-05 12:55", freq="5min")
+        chat = pd.DataFrame(
+            {
+                "Time": ana_times.append(pd.DatetimeIndex(["2020-10-05 13:01"])),
+                "User": ["Ana"] * len(ana_times) + ["Bob"],
+                "Message": ["Hola"] * len(ana_times) + ["Ciao"],
+            },
+            index=range(1, len(ana_times) + 2),
+        )
+        chat_network = ChatNetwork(chat=chat, conversation_gap="1h")
+        # When
+        conversations = chat_network.get_conversation_statistics()
+        edges = chat_network.get_directed_edges()
+        # Then
+        self.assertEqual([1, 1], list(chat_network.get_conversation_ids()))
+        self.assertEqual([pd.Timedelta("3h1min")], list(conversations["duration"]))
+        self.assertEqual([("Bob", "Ana")], list(zip(edges["Source"], edges["Target"])))
+
+    def test_adaptive_conversation_gap_cuts_unusually_long_silences(self):
+        # Given
+        minutes = [0, 1, 2, 4, 5, 7, 8, 9, 3 * 24 * 60, 3 * 24 * 60 + 1, 3 * 24 * 60 + 3]
+        chat = pd.DataFrame(
+            {
+                "Time": pd.Timestamp("2020-10-05 19:00") + pd.to_timedelta(minutes, unit="min"),
+                "User": ["Valen", "Bowen"] * 5 + ["Valen"],
+                "Message": "Hola",
+            },
+        )
+        # When
+        conversation_ids = ChatNetwork(chat=chat).get_conversation_ids()
+        # Then
+        self.assertEqual([1] * 8 + [2] * 3, list(conversation_ids))
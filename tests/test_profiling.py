@@ -0,0 +1,59 @@
+import unittest
+
+from src import profiling, whatsapp
+
+
+class ProfilingTests(unittest.TestCase):
+    WHATSAPP_EXPORT_NAME = "tests/helpers/ChatExampleContiguousMessages.txt"
+
+    def test_record_stages_of_read_chat(self):
+        # When
+        with profiling.profiling() as profile:
+            whatsapp.read_chat(self.WHATSAPP_EXPORT_NAME)
+        # Then
+        self.assertEqual(
+            [
+                "read_lines",
+                "lines_to_messages",
+                "messages_to_components",
+                "clean_chat_components",
+                "collapse_same_user_messages",
+                "read_chat",
+            ],
+            list(profile.stages),
+        )
+        collapse = profile.stages["collapse_same_user_messages"]
+        self.assertEqual((1, 4, 3), (collapse.calls, collapse.rows_in, collapse.rows_out))
+        self.assertGreaterEqual(profile.stages["read_chat"].wall_time, collapse.wall_time)
+
+    def test_record_peak_allocation_of_nested_stages(self):
+        # When
+        with profiling.profiling(trace_memory=True) as profile:
+            with profiling.stage("outer"):
+                big_list = [0] * 1000000
+                del big_list
+                with profiling.stage("inner") as run:
+                    run.rows_out = len([0] * 1000)
+        # Then
+        self.assertGreater(profile.stages["outer"].peak_allocation, 7000000)
+        self.assertLess(profile.stages["inner"].peak_allocation, 1000000)
+        self.assertEqual(1000, profile.stages["inner"].rows_out)
+
+    def test_do_not_record_anything_outside_profiling_context(self):
+        # Given
+        with profiling.profiling() as profile:
+            pass
+        # When
+        whatsapp.read_chat(self.WHATSAPP_EXPORT_NAME)
+        # Then
+        self.assertEqual({}, profile.stages)
+
+    def test_report_every_stage(self):
+        # Given
+        with profiling.profiling() as profile:
+            whatsapp.read_chat(self.WHATSAPP_EXPORT_NAME)
+        # When
+        report = profile.report()
+        # Then
+        self.assertIn("wall_time", report.splitlines()[0])
+        self.assertEqual(len(profile.stages) + 2, len(report.splitlines()))
@@ -0,0 +1,55 @@
+import unittest
+
+from src.selection_index import SelectionIndex
+
+
+class SelectionIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.selection_index = SelectionIndex(
+            ["user1", "user:2", "user3", "user4"],
+            [("user1", "user:2"), ("user:2", "user3"), ("user3", "user1"), ("user3", "user4")],
+        )
+
+    def test_node_names_with_colons_are_indexed(self):
+        self.assertEqual({0, 1}, self.selection_index.node_edges[1])
+
+    def test_all_edges_are_visible_when_no_node_is_selected(self):
+        self.assertEqual({0, 1, 2, 3}, self.selection_index.visible_edges(set()))
+
+    def test_edges_touching_the_node_are_visible_when_one_node_is_selected(self):
+        self.assertEqual({1, 2, 3}, self.selection_index.visible_edges({2}))
+
+    def test_only_edges_between_selected_nodes_are_visible_when_several_nodes_are_selected(self):
+        self.assertEqual({0, 1, 2}, self.selection_index.visible_edges({0, 1, 2}))
+
+    def test_unknown_selected_nodes_are_ignored(self):
+        self.assertEqual({0}, self.selection_index.selected_node_ids(["user1", "unknown"]))
+
+    def test_selection_changes(self):
+        # When
+        changed_nodes, changed_edges = self.selection_index.selection_changes(["user1"], ["user1", "user3"])
+        # Then
+        self.assertEqual({2}, changed_nodes)
+        self.assertEqual({0: False}, changed_edges)
+
+    def test_selection_changes_when_the_selection_is_started(self):
+        # When
+        changed_nodes, changed_edges = self.selection_index.selection_changes([], ["user4"])
+        # Then
+        self.assertEqual({3}, changed_nodes)
+        self.assertEqual({0: False, 1: False, 2: False}, changed_edges)
+
+    def test_selection_changes_when_the_selection_is_cleared(self):
+        # When
+        changed_nodes, changed_edges = self.selection_index.selection_changes(["user1"], [])
+        # Then
+        self.assertEqual({0}, changed_nodes)
+        self.assertEqual({1: True, 3: True}, changed_edges)
+
+    def test_dict_round_trip(self):
+        # When
+        selection_index = SelectionIndex.from_dict(self.selection_index.to_dict())
+        # Then
+        self.assertEqual(self.selection_index.nodes, selection_index.nodes)
+        self.assertEqual(self.selection_index.edges, selection_index.edges)
+        self.assertEqual(self.selection_index.node_edges, selection_index.node_edges)
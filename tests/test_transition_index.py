@@ -0,0 +1,154 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+from pandas._testing import assert_frame_equal, assert_series_equal
+
+from src.chat_network import ChatNetwork
+from src.transition_index import previous_speakers_matrix, SlidingWindowCounts, TransitionIndex
+
+
+class TransitionIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.chat = pd.DataFrame(
+            {
+                "Time": pd.to_datetime(
+                    [
+                        "2020-10-05 19:00",
+                        "2020-10-05 19:01",
+                        "2020-10-06 10:00",
+                        "2020-10-08 12:00",
+                        "2020-10-08 12:05",
+                        "2020-10-09 08:00",
+                    ]
+                ),
+                "User": ["Valen", "Bowen", "Ale", "Bowen", "Ale", "Valen"],
+                "Message": ["Hola", "Ciao", "Que mais", "Bien and you?", "Muy bieeen", "Genial"],
+            },
+        )
+        self.directed_edges = ChatNetwork(chat=self.chat).get_directed_edges()
+
+    def test_count_replies_between_every_pair_of_users_in_a_window(self):
+        # Given
+        transition_index = TransitionIndex(self.directed_edges, freq="D")
+        # When
+        count_matrix = transition_index.count_matrix(start="2020-10-06", end="2020-10-09")
+        # Then
+        self.assertEqual(["Ale", "Bowen", "Valen"], list(transition_index.users))
+        np.testing.assert_array_equal(
+            [
+                [0, 2, 0],
+                [1, 0, 0],
+                [0, 0, 0],
+            ],
+            count_matrix,
+        )
+
+    def test_index_only_keeps_the_buckets_of_the_pairs_that_replied(self):
+        # Given
+        users = [f"User{number}" for number in range(200)]
+        directed_edges = pd.DataFrame(
+            {
+                "Time": pd.date_range("2020-01-01", periods=1000, freq="D"),
+                "Source": users * 5,
+                "Target": (users[1:] + users[:1]) * 5,
+            }
+        )
+        # When
+        transition_index = TransitionIndex(directed_edges, freq="D")
+        # Then
+        self.assertEqual(1000, len(transition_index.cell_keys))
+        self.assertEqual(200, len(transition_index.pairs))
+        self.assertEqual(5, transition_index.edge_counts().loc[("User0", "User1")])
+        self.assertEqual(2, transition_index.edge_counts(start="2020-01-01", end="2021-01-01").loc[("User0", "User1")])
+
+    def test_edge_counts_of_whole_chat_are_the_grouped_directed_edges(self):
+        # Given
+        transition_index = TransitionIndex(self.directed_edges, freq="H")
+        expected_edge_counts = self.directed_edges.groupby(["Source", "Target"])["index"].count()
+        # When
+        edge_counts = transition_index.edge_counts()
+        # Then
+        assert_series_equal(expected_edge_counts, edge_counts, check_dtype=False)
+
+    def test_window_edges_are_weighted_like_the_edges_of_the_window_messages(self):
+        # Given
+        transition_index = TransitionIndex(self.directed_edges, freq="D")
+        window_edges = self.directed_edges[self.directed_edges["Time"] >= "2020-10-06"]
+        expected_edges = ChatNetwork.directed_edges_to_weighted(window_edges, count="count", out="out_edges")
+        # When
+        edges = ChatNetwork.get_window_directed_edges(
+            transition_index, start="2020-10-06", count="count", out="out_edges"
+        )
+        # Then
+        assert_frame_equal(expected_edges, edges, check_dtype=False)
+
+    def test_window_without_messages_has_no_edges(self):
+        # Given
+        transition_index = TransitionIndex(self.directed_edges, freq="D")
+        # When
+        edges = ChatNetwork.get_window_directed_edges(transition_index, start="2021-01-01", count="count")
+        # Then
+        self.assertTrue(edges.empty)
+        self.assertEqual(["count"], list(edges.columns))
+
+    def test_sliding_window_counts_match_counts_of_each_window(self):
+        # Given
+        sliding_window_counts = SlidingWindowCounts(self.directed_edges)
+        transition_index = TransitionIndex(self.directed_edges, freq="D")
+        # When
+        windows = list(sliding_window_counts.windows("2D", "1D"))
+        # Then
+        self.assertEqual(pd.date_range("2020-10-05", "2020-10-09", freq="D").tolist(), [start for start, _ in windows])
+        for window_start, count_matrix in windows:
+            np.testing.assert_array_equal(
+                transition_index.count_matrix(window_start, window_start + pd.Timedelta("2D")), count_matrix
+            )
+
+    def test_temporal_network_stacks_edges_and_node_sizes_of_every_window(self):
+        # When
+        edges, node_sizes = ChatNetwork(chat=self.chat).get_temporal_network("2D", "3D", count="count")
+        # Then
+        self.assertEqual(
+            [
+                (pd.Timestamp("2020-10-05"), "Ale", "Bowen", 1),
+                (pd.Timestamp("2020-10-05"), "Bowen", "Valen", 1),
+                (pd.Timestamp("2020-10-08"), "Ale", "Bowen", 1),
+                (pd.Timestamp("2020-10-08"), "Bowen", "Ale", 1),
+                (pd.Timestamp("2020-10-08"), "Valen", "Ale", 1),
+            ],
+            [(time, source, target, count) for (time, source, target), count in edges["count"].items()],
+        )
+        self.assertEqual([[0, 1, 1], [2, 1, 0]], node_sizes.values.tolist())
+
+    def test_previous_speakers_matrix_credits_k_distinct_speakers_with_decay(self):
+        # Given
+        user_codes = [0, 1, 0, 2, 2, 1]
+        expected_matrix = np.array(
+            [
+                [0, 1, 0],
+                [1.5, 0, 1],
+                [2, 1, 0],
+            ]
+        )
+        # When
+        matrix = previous_speakers_matrix(user_codes, 3, k=2, decay=0.5, block_size=2)
+        # Then
+        np.testing.assert_array_equal(expected_matrix, matrix)
+
+    def test_previous_speakers_matrix_of_one_speaker_counts_replies(self):
+        # Given
+        expected_edges = ChatNetwork.directed_edges_to_weighted(self.directed_edges, count="count")["count"]
+        # When
+        edges = ChatNetwork(chat=self.chat).get_previous_speakers_edges(k=1)
+        # Then
+        assert_series_equal(expected_edges, edges, check_names=False, check_dtype=False)
+
+    def test_previous_speakers_are_not_credited_across_conversations(self):
+        # Given
+        chat_network = ChatNetwork(chat=self.chat, conversation_gap="1D")
+        expected_edges = ChatNetwork.directed_edges_to_weighted(chat_network.get_directed_edges(), count="count")
+        # When
+        edges = chat_network.get_previous_speakers_edges(k=1)
+        # Then
+        assert_series_equal(expected_edges["count"], edges, check_names=False, check_dtype=False)
@@ -0,0 +1,84 @@
+import datetime
+import gzip
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.utils import timezone
+
+from src import whatsapp
+from web_analyzer.models import Chat, Message, StoredChatExport
+from web_analyzer.upload_handlers import ChatParsingUploadHandler
+from web_analyzer.upload_storage import UploadStorage
+
+
+class UploadStorageTests(TestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location)
+
+    def store(self, storage, content):
+        writer = storage.writer()
+        for start in range(0, len(content), 4):
+            writer.write(content[start:start + 4])
+        content_hash = f"{len(content):064d}"
+        storage.save(content_hash, writer)
+        return content_hash
+
+    def test_store_export_compressed_under_its_hash_once(self):
+        # Given
+        storage = UploadStorage(self.location, max_bytes=1024 * 1024)
+        content = "1/2/20 10:00 - Ana: Hola\n".encode("utf8") * 10
+        # When
+        content_hash = self.store(storage, content)
+        self.store(storage, content)
+        # Then
+        with storage.open(content_hash) as chat_export:
+            self.assertEqual(content.decode("utf8"), chat_export.read())
+        self.assertEqual(content, gzip.decompress(storage.path(content_hash).read_bytes()))
+        self.assertEqual([], list((storage.temporary_location).iterdir()))
+        self.assertEqual(2, StoredChatExport.objects.get().references)
+
+    def test_evict_least_recently_used_unreferenced_exports(self):
+        # Given
+        storage = UploadStorage(self.location, max_bytes=1024 * 1024)
+        oldest, referenced, newest = (self.store(storage, bytes(size)) for size in (10, 20, 30))
+        storage.release(oldest)
+        storage.release(newest)
+        StoredChatExport.objects.filter(content_hash=newest).update(last_used=timezone.now() + datetime.timedelta(1))
+        storage.max_bytes = storage.total_bytes() - 1
+        Chat.objects.load(oldest, whatsapp.read_chat("tests/helpers/ChatExample.txt"))
+        Chat.objects.load(referenced, whatsapp.read_chat("tests/helpers/ChatExample.txt"))
+        # When
+        evicted = storage.evict()
+        # Then
+        self.assertEqual([oldest], evicted)
+        self.assertEqual([referenced], list(Chat.objects.values_list("content_hash", flat=True)))
+        self.assertFalse(Message.objects.filter(chat__content_hash=oldest).exists())
+        self.assertFalse(storage.exists(oldest))
+        self.assertTrue(storage.exists(referenced))
+        self.assertTrue(storage.exists(newest))
+
+    def test_evict_exports_referenced_by_expired_sessions(self):
+        # Given
+        storage = UploadStorage(self.location, max_bytes=0, reference_timeout=60)
+        content_hash = self.store(storage, bytes(10))
+        StoredChatExport.objects.update(last_used=timezone.now() - datetime.timedelta(seconds=61))
+        # When
+        evicted = storage.evict()
+        # Then
+        self.assertEqual([content_hash], evicted)
+        self.assertEqual(0, storage.total_bytes())
+
+    def test_interrupted_upload_discards_its_compressed_export(self):
+        # Given
+        storage = UploadStorage(self.location, max_bytes=1024 * 1024)
+        handler = ChatParsingUploadHandler()
+        with patch("web_analyzer.upload_handlers.upload_storage.get_storage", return_value=storage):
+            handler.new_file("chat_file", "MyChat.txt", "text/plain", 100)
+        handler.receive_data_chunk("1/2/20 10:00 - Ana: Hola\n".encode("utf8"), 0)
+        # When
+        handler.upload_interrupted()
+        # Then
+        self.assertEqual([], list(storage.temporary_location.iterdir()))
@@ -1,17 +1,32 @@
+import concurrent.futures
+import gzip
 from importlib import import_module
+import json
 import os
 from pathlib import Path
-from unittest.mock import call, patch
+from unittest.mock import call, Mock, patch
 
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.testing import WebsocketCommunicator
 from django.conf import settings
 from django.core.files import File
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.core.signing import JSONSerializer
+from django.test import Client, override_settings, TestCase
 from django.urls import reverse
+import pandas as pd
+from pandas._testing import assert_frame_equal
 import plotly.graph_objects as go
 from rest_framework import status
 
+from src import whatsapp
 from src.chat_network import ChatNetwork
+from web_analyzer import analysis_cache, dash_apps, exports, metrics, tasks
+from web_analyzer.analysis_executor import AnalysisExecutor, AnalysisExecutorBusy
+from web_analyzer.consumers import AnalysisProgressConsumer
+from web_analyzer.models import Chat, StoredChatExport
+from web_analyzer.session_serializers import MessagePackSerializer
+from web_analyzer.upload_storage import get_storage
 
 
 class WebTests(TestCase):
@@ -24,6 +39,8 @@ class WebTests(TestCase):
         store.save()
         self.session = store
         self.client.cookies[settings.SESSION_COOKIE_NAME] = store.session_key
+        analysis_cache.get_cache().clear()
+        metrics.get_cache().clear()
 
     @classmethod
     def tearDownClass(cls):
@@ -139,31 +156,39 @@ class WebTests(TestCase):
     @patch.object(
         ChatNetwork,
         "draw",
-        side_effect=[(go.Figure(), "my_node_traces", "my_edge_traces"), go.Figure()],
+        side_effect=[(go.Figure(), "node_traces", "edge_traces", "selection_index"), go.Figure()],
         autospec=True
     )
-    def test_use_traces_if_they_are_saved_in_session(self, draw_mock):
+    def test_use_traces_if_they_are_cached(self, draw_mock):
         # Given
         file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
         uploaded_file = SimpleUploadedFile('MyChat.txt', file1.read(), 'text/plain')
         self.client.post("/upload_chat/", {"chat_file": uploaded_file}, follow=False)
 
-        self.add_data_to_session({
-            "node_traces": "my_node_traces",
-            "edge_traces": "my_edge_traces",
-        })
+        analysis_cache.set_analysis(
+            self.client.session["analysis_key"],
+            node_traces="my_node_traces",
+            edge_traces="my_edge_traces",
+            selection_index="my_selection_index",
+        )
         # When
-        self.client.get("/stats/")
+        dash_apps.get_figure(self.client.session["analysis_key"])
         # Then
         draw_mock.assert_has_calls([
             call(draw_mock.call_args_list[0][0][0], return_traces=True),
-            call(draw_mock.call_args_list[1][0][0], node_traces="my_node_traces", edge_traces="my_edge_traces"),
+            call(
+                draw_mock.call_args_list[1][0][0],
+                node_traces="my_node_traces",
+                edge_traces="my_edge_traces",
+                selection_index="my_selection_index",
+                selected_nodes=[],
+            ),
         ])
 
     @patch.object(
         ChatNetwork,
         "draw",
-        side_effect=[(go.Figure(), "node_traces", "edge_traces"), go.Figure()],
+        side_effect=[(go.Figure(), "node_traces", "edge_traces", "selection_index"), go.Figure()],
         autospec=True
     )
     def test_calculate_traces_and_then_use_them_next_time_you_visit_the_page(self, draw_mock):
@@ -173,30 +198,40 @@ class WebTests(TestCase):
         c = Client()
         c.post("/upload_chat/", {"chat_file": uploaded_file}, follow=False)
         # When
-        c.get("/stats/")
+        dash_apps.get_figure(c.session["analysis_key"])
+        dash_apps.get_figure(c.session["analysis_key"])
         # Then
+        self.assertEqual(2, draw_mock.call_count)
         draw_mock.assert_has_calls([
             call(draw_mock.call_args_list[0][0][0], return_traces=True),
-            call(draw_mock.call_args_list[1][0][0], node_traces="node_traces", edge_traces="edge_traces")
+            call(
+                draw_mock.call_args_list[1][0][0],
+                node_traces="node_traces",
+                edge_traces="edge_traces",
+                selection_index="selection_index",
+                selected_nodes=[],
+            )
         ])
-        self.assertEqual("node_traces", c.session["node_traces"])
-        self.assertEqual("edge_traces", c.session["edge_traces"])
+        self.assertEqual(
+            {"node_traces": "node_traces", "edge_traces": "edge_traces"},
+            analysis_cache.get_analysis(c.session["analysis_key"], "node_traces", "edge_traces"),
+        )
 
     @patch.object(
         ChatNetwork,
         "draw",
-        return_value=(go.Figure(), "node_traces", "edge_traces"),
+        return_value=(go.Figure(), "node_traces", "edge_traces", "selection_index"),
         autospec=True
     )
-    def test_delete_traces_from_session_when_new_chat_is_uploaded(self, draw_mock):
+    def test_replace_analysis_key_in_session_when_new_chat_is_uploaded(self, draw_mock):
         # Given
         self.add_data_to_session({
-            "node_traces": "old_node_traces",
-            "edge_traces": "old_edge_traces",
+            "analysis_key": "old_analysis_key",
         })
 
         file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
-        uploaded_file = SimpleUploadedFile('MyChat.txt', file1.read(), 'text/plain')
+        chat_content = file1.read()
+        uploaded_file = SimpleUploadedFile('MyChat.txt', chat_content, 'text/plain')
         file1.close()
         # When
         self.client.post("/upload_chat/", {"chat_file": uploaded_file}, follow=False)
@@ -204,13 +239,12 @@ class WebTests(TestCase):
         draw_mock.assert_called_once_with(
             draw_mock.call_args[0][0], return_traces=True
         )
-        self.assertEqual("node_traces", self.client.session["node_traces"])
-        self.assertEqual("edge_traces", self.client.session["edge_traces"])
+        self.assertEqual(analysis_cache.chat_content_key(chat_content), self.client.session["analysis_key"])
 
     @patch.object(
         ChatNetwork,
         "draw",
-        return_value=(go.Figure(), "node_traces", "edge_traces"),
+        return_value=(go.Figure(), "node_traces", "edge_traces", "selection_index"),
         autospec=True
     )
     def test_generate_traces_and_discard_file_after_uploading(self, draw_mock):
@@ -225,5 +259,633 @@ class WebTests(TestCase):
         draw_mock.assert_called_once_with(
             draw_mock.call_args[0][0], return_traces=True,
         )
-        self.assertEqual("node_traces", self.client.session["node_traces"])
-        self.assertIsNotNone("edge_traces", self.client.session["edge_traces"])
+        self.assertEqual(
+            {"node_traces": "node_traces"},
+            analysis_cache.get_analysis(self.client.session["analysis_key"], "node_traces"),
+        )
+        self.assertNotIn("node_traces", self.client.session)
+        self.assertNotIn("edge_traces", self.client.session)
+
+    def test_stats_page_redirects_to_upload_page_if_cached_analysis_expired(self):
+        # Given
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        uploaded_file = SimpleUploadedFile('MyChat.txt', file1.read(), 'text/plain')
+        self.client.post("/upload_chat/", {"chat_file": uploaded_file}, follow=False)
+        analysis_cache.get_cache().clear()
+        expected_redirections = [(reverse("home"), 302), (reverse('upload_chat'), 302)]
+        # When
+        response = self.client.get("/stats/", follow=True)
+        # Then
+        self.assertEqual(expected_redirections, response.redirect_chain)
+
+    def test_node_click_callback_returns_only_the_selection_delta(self):
+        # Given
+        _, _, _, selection_index = ChatNetwork("tests/helpers/ChatExample.txt").draw(return_traces=True)
+        analysis_cache.set_analysis("analysis_key", selection_index=selection_index)
+        request = Mock(session={"analysis_key": "analysis_key", "selected_nodes": []})
+        # When
+        delta = dash_apps.nodes_selected_callback({"points": [{"customdata": "Rubén"}]}, request=request)
+        # Then
+        self.assertEqual(["Rubén"], request.session["selected_nodes"])
+        self.assertEqual([1], list(delta["opacity"].values()))
+
+    def test_node_click_callback_does_not_update_a_session_without_analysis(self):
+        # Given
+        request = Mock(session={})
+        # When / Then
+        with self.assertRaises(dash_apps.PreventUpdate):
+            dash_apps.nodes_selected_callback({"points": [{"customdata": "Rubén"}]}, request=request)
+
+    def test_activity_cube_is_stored_with_the_uploaded_chat(self):
+        # Given
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        uploaded_file = SimpleUploadedFile('MyChat.txt', file1.read(), 'text/plain')
+        file1.close()
+        # When
+        self.client.post("/upload_chat/", {"chat_file": uploaded_file})
+        # Then
+        analysis_key = self.client.session["analysis_key"]
+        analysis = analysis_cache.get_analysis(analysis_key, analysis_cache.ACTIVITY_CUBE_FIELD)
+        self.assertEqual(
+            len(whatsapp.read_chat('tests/helpers/ChatExample.txt')),
+            analysis[analysis_cache.ACTIVITY_CUBE_FIELD].rollup(),
+        )
+
+    def test_activity_callback_draws_the_heatmap_and_timeline_of_the_selected_user(self):
+        # Given
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        uploaded_file = SimpleUploadedFile('MyChat.txt', file1.read(), 'text/plain')
+        file1.close()
+        self.client.post("/upload_chat/", {"chat_file": uploaded_file})
+        analysis_key = self.client.session["analysis_key"]
+        analysis_cache.delete_analysis(analysis_key, analysis_cache.ACTIVITY_CUBE_FIELD)
+        request = Mock(session={"analysis_key": analysis_key})
+        # When
+        heatmap, timeline = dash_apps.activity_callback("Rubén", request=request)
+        # Then
+        self.assertEqual(1, sum(map(sum, heatmap.data[0].z)))
+        self.assertEqual(
+            {"Rubén": True}, {trace.name: trace.visible for trace in timeline.data if trace.visible is True}
+        )
+        self.assertEqual(
+            ["Bowen", "Rubén", "Valen"],
+            [option["value"] for option in dash_apps.activity_users_callback("activity", request=request)],
+        )
+
+    def test_metrics_report_uploads_and_analysis_latency_by_group_size(self):
+        # Given
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        chat_content = file1.read()
+        file1.close()
+        self.client.post("/upload_chat/", {"chat_file": SimpleUploadedFile('MyChat.txt', chat_content)})
+        num_participants = whatsapp.read_chat('tests/helpers/ChatExample.txt')["User"].nunique()
+        group_size = metrics.group_size(num_participants)
+        # When
+        response = Client().get(reverse("metrics"))
+        # Then
+        self.assertEqual(metrics.CONTENT_TYPE, response["Content-Type"])
+        samples = response.content.decode()
+        self.assertIn('whatsapp_upload_bytes_bucket{le="1000"} 1\n', samples)
+        self.assertIn(f"whatsapp_upload_bytes_sum {float(len(chat_content))}\n", samples)
+        self.assertIn('whatsapp_upload_participants_bucket{le="+Inf"} 1\n', samples)
+        self.assertIn(f'whatsapp_analysis_seconds_count{{group_size="{group_size}"}} 1\n', samples)
+        self.assertIn(
+            f'whatsapp_analysis_stage_seconds_count{{stage="layout",group_size="{group_size}"}} 1\n', samples
+        )
+        self.assertIn('whatsapp_analyses_total{status="ready"} 1\n', samples)
+        self.assertIn("whatsapp_session_bytes_count", samples)
+        self.assertIn('whatsapp_analysis_cache_lookups_total{result="miss"} 1\n', samples)
+        self.assertIn("whatsapp_analysis_cache_hit_ratio 0.0\n", samples)
+
+    def test_metrics_report_dash_callback_latency(self):
+        # Given
+        request = Mock(session={"analysis_key": "missing", "selected_nodes": []})
+        # When
+        with self.assertRaises(dash_apps.PreventUpdate):
+            dash_apps.nodes_selected_callback(None, request=request)
+        # Then
+        self.assertIn(
+            'whatsapp_dash_callback_seconds_count{callback="nodes_selected"} 1\n',
+            Client().get(reverse("metrics")).content.decode(),
+        )
+
+    def test_analysis_cache_lookups_survive_culling_the_analysis_cache(self):
+        # Given
+        metrics.record_analysis_cache_lookup(hit=True)
+        metrics.record_analysis_cache_lookup(hit=False)
+        # When
+        analysis_cache.get_cache().clear()
+        # Then
+        self.assertEqual({"hits": 1, "misses": 1, "hit_ratio": 0.5}, metrics.analysis_cache_lookup_statistics())
+
+    def test_histogram_buckets_are_cumulative(self):
+        # Given
+        histogram = metrics.Histogram("test_histogram", "Test.", [1, 10], ["kind"])
+        metrics.REGISTRY.remove(histogram)
+        # When
+        for value in (0.5, 1, 5, 50):
+            histogram.observe(value, kind="a")
+        # Then
+        self.assertEqual(
+            [
+                ("test_histogram_bucket", {"kind": "a", "le": "1"}, 2),
+                ("test_histogram_bucket", {"kind": "a", "le": "10"}, 3),
+                ("test_histogram_bucket", {"kind": "a", "le": "+Inf"}, 4),
+                ("test_histogram_sum", {"kind": "a"}, 56.5),
+                ("test_histogram_count", {"kind": "a"}, 4),
+            ],
+            list(histogram.samples(metrics.get_cache())),
+        )
+
+    def test_series_observed_concurrently_for_the_first_time_are_all_registered(self):
+        # Given
+        counter = metrics.Counter("test_counter", "Test.", ["kind"])
+        metrics.REGISTRY.remove(counter)
+        kinds = [str(kind) for kind in range(8)]
+        # When
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(kinds)) as executor:
+            list(executor.map(lambda kind: counter.inc(kind=kind), kinds * 2))
+        # Then
+        self.assertEqual(
+            {kind: 2 for kind in kinds},
+            {labels["kind"]: value for _, labels, value in counter.samples(metrics.get_cache())},
+        )
+        self.assertEqual(len(kinds), len(counter.series(metrics.get_cache())))
+
+    def test_figure_callback_returns_the_figure_with_the_selection_of_the_session(self):
+        # Given
+        _, node_traces, edge_traces, selection_index = ChatNetwork("tests/helpers/ChatExample.txt").draw(
+            return_traces=True
+        )
+        analysis_cache.set_analysis(
+            "analysis_key", node_traces=node_traces, edge_traces=edge_traces, selection_index=selection_index
+        )
+        request = Mock(session={"analysis_key": "analysis_key", "selected_nodes": ["Rubén"]})
+        expected_figure = ChatNetwork().draw(
+            node_traces=node_traces,
+            edge_traces=edge_traces,
+            selection_index=selection_index,
+            selected_nodes=["Rubén"],
+        )
+        # When
+        figure = dash_apps.figure_callback("network-graph", request=request)
+        # Then
+        self.assertEqual(
+            [trace.visible for trace in expected_figure.data],
+            [trace.get("visible") for trace in figure["data"]],
+        )
+        self.assertEqual(
+            [trace.marker.opacity for trace in expected_figure.data],
+            [trace.get("marker", {}).get("opacity") for trace in figure["data"]],
+        )
+        self.assertEqual(800, figure["layout"]["height"])
+
+    @patch.object(
+        ChatNetwork,
+        "draw",
+        return_value=(go.Figure(), "node_traces", "edge_traces", "selection_index"),
+        autospec=True
+    )
+    def test_do_not_analyse_again_a_chat_that_was_already_uploaded(self, draw_mock):
+        # Given
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        chat_content = file1.read()
+        file1.close()
+        self.client.post("/upload_chat/", {"chat_file": SimpleUploadedFile('MyChat.txt', chat_content)})
+        # When
+        Client().post("/upload_chat/", {"chat_file": SimpleUploadedFile('OtherName.txt', chat_content)})
+        # Then
+        draw_mock.assert_called_once()
+        self.assertEqual(
+            {"hits": 1, "misses": 1, "hit_ratio": 0.5},
+            metrics.analysis_cache_lookup_statistics(),
+        )
+
+    def test_session_serializer_reads_sessions_saved_as_json(self):
+        # Given
+        session = {"chat_file_name": "Chat ñ.txt", "analysis_key": "key", "selected_nodes": ["Rubén"]}
+        serializer = MessagePackSerializer()
+        # When
+        round_trip = serializer.loads(serializer.dumps(session))
+        from_json = serializer.loads(JSONSerializer().dumps(session))
+        # Then
+        self.assertEqual(session, round_trip)
+        self.assertEqual(session, from_json)
+        self.assertLess(len(serializer.dumps(session)), len(JSONSerializer().dumps(session)))
+
+    def test_uploads_of_the_same_chat_share_the_stored_export(self):
+        # Given
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        chat_content = file1.read()
+        file1.close()
+        content_hash = analysis_cache.chat_content_key(chat_content)
+        # When
+        self.client.post("/upload_chat/", {"chat_file": SimpleUploadedFile('WhatsApp Chat.txt', chat_content)})
+        Client().post("/upload_chat/", {"chat_file": SimpleUploadedFile('WhatsApp Chat.txt', chat_content)})
+        # Then
+        with get_storage().open(content_hash) as chat_export:
+            self.assertEqual(chat_content.decode("utf8"), chat_export.read())
+        self.assertEqual(2, StoredChatExport.objects.get(content_hash=content_hash).references)
+
+    def test_uploading_another_chat_releases_the_previous_export(self):
+        # Given
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        chat_content = file1.read()
+        file1.close()
+        other_chat_content = chat_content + "5/10/20 15:45 - Rubén: Genial\n".encode("utf8")
+        self.client.post("/upload_chat/", {"chat_file": SimpleUploadedFile('MyChat.txt', chat_content)})
+        # When
+        self.client.post("/upload_chat/", {"chat_file": SimpleUploadedFile('MyChat.txt', other_chat_content)})
+        # Then
+        self.assertEqual(
+            {analysis_cache.chat_content_key(chat_content): 0, analysis_cache.chat_content_key(other_chat_content): 1},
+            dict(StoredChatExport.objects.values_list("content_hash", "references")),
+        )
+
+    def test_analyse_chat_from_upload_storage_if_it_is_not_in_cache_or_database(self):
+        # Given
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        chat_content = file1.read()
+        file1.close()
+        self.client.post("/upload_chat/", {"chat_file": SimpleUploadedFile('MyChat.txt', chat_content)})
+        analysis_key = self.client.session["analysis_key"]
+        analysis_cache.get_cache().clear()
+        Chat.objects.all().delete()
+        # When
+        chat = tasks.get_chat(analysis_key)
+        # Then
+        assert_frame_equal(whatsapp.read_chat('tests/helpers/ChatExample.txt'), chat)
+
+    def test_upload_view_still_checks_csrf_token(self):
+        # Given
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        chat_content = file1.read()
+        file1.close()
+        c = Client(enforce_csrf_checks=True)
+        # When
+        response = c.post("/upload_chat/", {"chat_file": SimpleUploadedFile('MyChat.txt', chat_content)})
+        # Then
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+        self.assertIsNone(analysis_cache.get_status(analysis_cache.chat_content_key(chat_content)))
+
+    @override_settings(ANALYSIS_EXECUTOR=tasks.PROCESS_POOL_EXECUTOR)
+    def test_analyse_chat_in_process_pool(self):
+        # Given
+        executor = AnalysisExecutor(max_workers=1, max_queued=0)
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        uploaded_file = SimpleUploadedFile('MyChat.txt', file1.read(), 'text/plain')
+        file1.close()
+        # When
+        with patch.object(tasks.analysis_executor, "get_executor", return_value=executor):
+            self.client.post("/upload_chat/", {"chat_file": uploaded_file})
+            executor.shutdown()
+        # Then
+        self.assertEqual(
+            analysis_cache.STATUS_READY,
+            analysis_cache.get_status(self.client.session["analysis_key"]),
+        )
+        self.assertIsNotNone(
+            analysis_cache.get_analysis(self.client.session["analysis_key"], *analysis_cache.ANALYSIS_FIELDS)
+        )
+
+    @override_settings(ANALYSIS_EXECUTOR=tasks.PROCESS_POOL_EXECUTOR)
+    @patch.object(tasks.analysis_executor, "get_executor")
+    def test_reject_upload_when_process_pool_is_busy(self, get_executor_mock):
+        # Given
+        get_executor_mock.return_value.submit.side_effect = AnalysisExecutorBusy
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        chat_content = file1.read()
+        file1.close()
+        # When
+        response = self.client.post("/upload_chat/", {"chat_file": SimpleUploadedFile('MyChat.txt', chat_content)})
+        # Then
+        self.assertEqual(status.HTTP_503_SERVICE_UNAVAILABLE, response.status_code)
+        self.assertContains(response, "Try again in a few minutes", status_code=503)
+        self.assertIsNone(self.client.session.get("chat_file_name"))
+        self.assertIsNone(analysis_cache.get_status(analysis_cache.chat_content_key(chat_content)))
+
+    def test_analysis_status_is_ready_after_uploading_a_chat(self):
+        # Given
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        uploaded_file = SimpleUploadedFile('MyChat.txt', file1.read(), 'text/plain')
+        self.client.post("/upload_chat/", {"chat_file": uploaded_file})
+        # When
+        response = self.client.get(reverse("analysis_status"))
+        # Then
+        self.assertEqual({"status": "ready", "analysis_key": self.client.session["analysis_key"]}, response.json())
+
+    def test_api_returns_edges_and_nodes_of_analysed_chat(self):
+        # Given
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        uploaded_file = SimpleUploadedFile('MyChat.txt', file1.read(), 'text/plain')
+        self.client.post("/upload_chat/", {"chat_file": uploaded_file})
+        analysis_key = self.client.session["analysis_key"]
+        # When
+        edges = self.client.get(reverse("api_edges", args=[analysis_key]))
+        nodes = self.client.get(reverse("api_nodes", args=[analysis_key]))
+        # Then
+        self.assertEqual(
+            [("Bowen", "Rubén", 1), ("Valen", "Bowen", 1)],
+            [(edge["Source"], edge["Target"], edge["count"]) for edge in edges.json()],
+        )
+        self.assertEqual(
+            {"Rubén": 1, "Bowen": 1, "Valen": 0},
+            {node["node"]: node["replies_received"] for node in nodes.json()},
+        )
+
+    def test_api_returns_edges_of_a_time_window(self):
+        # Given
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        uploaded_file = SimpleUploadedFile('MyChat.txt', file1.read(), 'text/plain')
+        self.client.post("/upload_chat/", {"chat_file": uploaded_file})
+        url = reverse("api_edges", args=[self.client.session["analysis_key"]])
+        # When
+        window_edges = self.client.get(url, {"start": "2020-05-10T15:00:00", "end": "2020-05-11T00:00:00"})
+        empty_window_edges = self.client.get(url, {"start": "2021-01-01T00:00:00"})
+        # Then
+        self.assertEqual(
+            [("Bowen", "Rubén", 1), ("Valen", "Bowen", 1)],
+            [(edge["Source"], edge["Target"], edge["count"]) for edge in window_edges.json()],
+        )
+        self.assertEqual([], empty_window_edges.json())
+
+    def test_api_returns_temporal_network_of_sliding_windows(self):
+        # Given
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        uploaded_file = SimpleUploadedFile('MyChat.txt', file1.read(), 'text/plain')
+        self.client.post("/upload_chat/", {"chat_file": uploaded_file})
+        url = reverse("api_temporal", args=[self.client.session["analysis_key"]])
+        # When
+        response = self.client.get(url, {"window": "1D", "step": "12H"})
+        too_many_windows_response = self.client.get(url, {"step": "1s"})
+        # Then
+        self.assertEqual(["2020-05-10T00:00:00", "2020-05-10T12:00:00"], response.json()["windows"])
+        self.assertEqual(["Bowen", "Rubén", "Valen"], response.json()["users"])
+        self.assertEqual([[1, 1, 0], [1, 1, 0]], response.json()["node_sizes"])
+        self.assertEqual(4, len(response.json()["edges"]))
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, too_many_windows_response.status_code)
+
+    def test_api_returns_not_modified_if_analysis_did_not_change(self):
+        # Given
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        uploaded_file = SimpleUploadedFile('MyChat.txt', file1.read(), 'text/plain')
+        self.client.post("/upload_chat/", {"chat_file": uploaded_file})
+        url = reverse("api_figure", args=[self.client.session["analysis_key"]])
+        response = self.client.get(url)
+        # When
+        with patch.object(dash_apps, "get_figure", autospec=True) as get_figure_mock:
+            etag_response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+            last_modified_response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        # Then
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(f'"{self.client.session["analysis_key"]}"', response["ETag"])
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, etag_response.status_code)
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, last_modified_response.status_code)
+        get_figure_mock.assert_not_called()
+
+    def test_api_returns_not_found_if_chat_was_not_analysed(self):
+        # When
+        response = Client().get(reverse("api_edges", args=["unknown"]))
+        # Then
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+        self.assertFalse(response.has_header("ETag"))
+
+    def test_export_messages_as_csv_in_batches(self):
+        # Given
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        uploaded_file = SimpleUploadedFile('MyChat.txt', file1.read(), 'text/plain')
+        self.client.post("/upload_chat/", {"chat_file": uploaded_file})
+        url = reverse("export_messages", args=[self.client.session["analysis_key"], "csv"])
+        # When
+        with patch.object(exports, "EXPORT_BATCH_SIZE", 2):
+            response = self.client.get(url)
+            content = b"".join(response.streaming_content).decode("utf-8")
+        # Then
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            [
+                "Time,User,Message",
+                "2020-05-10 15:44:00,Rubén,¿Hey qué tal?",
+                "2020-05-10 15:44:00,Bowen,\"Bieenn, y tu\"",
+                "2020-05-10 15:49:00,Valen,¿Cómo estáis?",
+            ],
+            content.splitlines(),
+        )
+
+    def test_export_gzipped_edges_as_ndjson(self):
+        # Given
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        uploaded_file = SimpleUploadedFile('MyChat.txt', file1.read(), 'text/plain')
+        self.client.post("/upload_chat/", {"chat_file": uploaded_file})
+        url = reverse("export_edges", args=[self.client.session["analysis_key"], "ndjson"])
+        # When
+        response = self.client.get(url, {"compression": "gzip"})
+        content = gzip.decompress(b"".join(response.streaming_content)).decode("utf-8")
+        # Then
+        self.assertEqual('attachment; filename="edges.ndjson.gz"', response["Content-Disposition"])
+        self.assertEqual(
+            [("Bowen", "Rubén", 1), ("Valen", "Bowen", 1)],
+            [(edge["Source"], edge["Target"], edge["count"]) for edge in map(json.loads, content.splitlines())],
+        )
+
+    def test_export_edges_of_a_user_replying_or_replied_in_the_whole_chat(self):
+        # Given
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        uploaded_file = SimpleUploadedFile('MyChat.txt', file1.read(), 'text/plain')
+        self.client.post("/upload_chat/", {"chat_file": uploaded_file})
+        url = reverse("export_edges", args=[self.client.session["analysis_key"], "ndjson"])
+        # When
+        response = self.client.get(url, {"user": "Rubén"})
+        # Then
+        self.assertEqual(
+            [("Bowen", "Rubén", 1)],
+            [
+                (edge["Source"], edge["Target"], edge["count"])
+                for edge in map(json.loads, b"".join(response.streaming_content).decode("utf-8").splitlines())
+            ],
+        )
+
+    def test_export_edges_of_a_window_without_replies_is_only_the_header(self):
+        # Given
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        uploaded_file = SimpleUploadedFile('MyChat.txt', file1.read(), 'text/plain')
+        self.client.post("/upload_chat/", {"chat_file": uploaded_file})
+        url = reverse("export_edges", args=[self.client.session["analysis_key"], "csv"])
+        # When
+        response = self.client.get(url, {"start": "2030-01-01T00:00:00"})
+        # Then
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(
+            ["Source,Target,count,CDF,deviations"],
+            b"".join(response.streaming_content).decode("utf-8").splitlines(),
+        )
+
+    def test_exports_and_api_return_not_found_to_other_sessions(self):
+        # Given
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        uploaded_file = SimpleUploadedFile('MyChat.txt', file1.read(), 'text/plain')
+        self.client.post("/upload_chat/", {"chat_file": uploaded_file})
+        analysis_key = self.client.session["analysis_key"]
+        urls = [
+            reverse("export_messages", args=[analysis_key, "csv"]),
+            reverse("export_edges", args=[analysis_key, "ndjson"]),
+            reverse("api_edges", args=[analysis_key]),
+            reverse("api_nodes", args=[analysis_key]),
+            reverse("api_figure", args=[analysis_key]),
+            reverse("api_temporal", args=[analysis_key]),
+        ]
+        # When
+        responses = [Client().get(url) for url in urls]
+        # Then
+        self.assertEqual([status.HTTP_404_NOT_FOUND] * len(urls), [response.status_code for response in responses])
+
+    def test_export_returns_not_found_for_unknown_format(self):
+        # Given
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        uploaded_file = SimpleUploadedFile('MyChat.txt', file1.read(), 'text/plain')
+        self.client.post("/upload_chat/", {"chat_file": uploaded_file})
+        # When
+        response = self.client.get(reverse("export_edges", args=[self.client.session["analysis_key"], "xlsx"]))
+        # Then
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    def test_store_chat_in_database_and_read_it_back(self):
+        # Given
+        chat = whatsapp.read_chat("tests/helpers/ChatExampleSplitLines.txt")
+        # When
+        stored_chat = Chat.objects.load("content_hash", chat, name="MyChat.txt", batch_size=2)
+        # Then
+        assert_frame_equal(chat, Chat.objects.get(content_hash="content_hash").to_dataframe())
+        self.assertEqual(["Bowen", "Rubén", "Valen"], sorted(stored_chat.participants.values_list("name", flat=True)))
+
+    def test_query_stored_messages_by_time_range_and_user(self):
+        # Given
+        chat = whatsapp.read_chat("tests/helpers/ChatExample.txt")
+        stored_chat = Chat.objects.load("content_hash", chat)
+        # When
+        messages_before = stored_chat.to_dataframe(end=pd.Timestamp("2020-05-10 15:45", tz="UTC"))
+        messages_by_user = stored_chat.to_dataframe(users=["Valen"])
+        # Then
+        self.assertEqual(["Rubén", "Bowen"], list(messages_before["User"]))
+        self.assertEqual(["¿Cómo estáis?"], list(messages_by_user["Message"]))
+
+    def test_store_uploaded_chat_in_database_only_once(self):
+        # Given
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        chat_content = file1.read()
+        file1.close()
+        # When
+        self.client.post("/upload_chat/", {"chat_file": SimpleUploadedFile('MyChat.txt', chat_content)})
+        Client().post("/upload_chat/", {"chat_file": SimpleUploadedFile('OtherName.txt', chat_content)})
+        # Then
+        stored_chat = Chat.objects.get()
+        self.assertEqual(self.client.session["analysis_key"], stored_chat.content_hash)
+        self.assertEqual(3, stored_chat.messages.count())
+
+    def test_analyse_chat_from_database_if_it_expired_from_the_cache(self):
+        # Given
+        Chat.objects.load("analysis_key", whatsapp.read_chat("tests/helpers/ChatExample.txt"))
+        # When
+        tasks.analyse_chat("analysis_key")
+        # Then
+        self.assertEqual(analysis_cache.STATUS_READY, analysis_cache.get_status("analysis_key"))
+
+    def test_export_messages_of_a_user_from_database(self):
+        # Given
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        uploaded_file = SimpleUploadedFile('MyChat.txt', file1.read(), 'text/plain')
+        self.client.post("/upload_chat/", {"chat_file": uploaded_file})
+        url = reverse("export_messages", args=[self.client.session["analysis_key"], "ndjson"])
+        # When
+        response = self.client.get(url, {"user": "Bowen", "start": "2020-05-10T15:00:00"})
+        bad_request_response = self.client.get(url, {"start": "yesterday"})
+        # Then
+        self.assertEqual(
+            [{"Time": "2020-05-10T15:44:00.000", "User": "Bowen", "Message": "Bieenn, y tu"}],
+            [json.loads(line) for line in b"".join(response.streaming_content).decode("utf-8").splitlines()],
+        )
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, bad_request_response.status_code)
+
+    @patch.object(tasks.analyse_chat, "delay", autospec=True)
+    def test_uploaded_chat_is_stored_in_database_by_the_analysis_not_the_upload(self, delay_mock):
+        # Given
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        uploaded_file = SimpleUploadedFile('MyChat.txt', file1.read(), 'text/plain')
+        file1.close()
+        # When
+        self.client.post("/upload_chat/", {"chat_file": uploaded_file})
+        stored_before_analysis = Chat.objects.exists()
+        tasks.analyse_chat(*delay_mock.call_args.args)
+        # Then
+        self.assertFalse(stored_before_analysis)
+        self.assertEqual("MyChat.txt", Chat.objects.get(content_hash=self.client.session["analysis_key"]).name)
+
+    @patch.object(tasks.analyse_chat, "delay", autospec=True)
+    def test_stats_page_polls_analysis_status_while_analysis_is_pending(self, delay_mock):
+        # Given
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        uploaded_file = SimpleUploadedFile('MyChat.txt', file1.read(), 'text/plain')
+        self.client.post("/upload_chat/", {"chat_file": uploaded_file})
+        # When
+        response = self.client.get("/stats/")
+        # Then
+        delay_mock.assert_called_once_with(self.client.session["analysis_key"], "MyChat.txt")
+        self.assertContains(response, "Analysing chat")
+        self.assertContains(response, reverse("analysis_status"))
+        self.assertEqual("pending", self.client.get(reverse("analysis_status")).json()["status"])
+
+    @patch.object(ChatNetwork, "draw", side_effect=ValueError, autospec=True)
+    def test_stats_page_redirects_to_upload_page_if_analysis_failed(self, draw_mock):
+        # Given
+        file1 = File(open('tests/helpers/ChatExample.txt', 'rb'))
+        uploaded_file = SimpleUploadedFile('MyChat.txt', file1.read(), 'text/plain')
+        expected_redirections = [
+            (reverse("chat_statistics"), 302),
+            (reverse("home") + "?decodingerror=true", 302),
+            (reverse('upload_chat') + "?decodingerror=true", 302)
+        ]
+        # When
+        response = self.client.post("/upload_chat/", {"chat_file": uploaded_file}, follow=True)
+        # Then
+        self.assertEqual(expected_redirections, response.redirect_chain)
+        self.assertEqual("error", analysis_cache.get_status(self.client.session["analysis_key"]))
+
+    def test_progress_consumer_streams_progress_of_pending_analysis(self):
+        # Given
+        analysis_cache.set_analysis("analysis_key", status="pending")
+        communicator = WebsocketCommunicator(
+            lambda scope: AnalysisProgressConsumer(dict(scope, session={"analysis_key": "analysis_key"})),
+            "/ws/analysis/progress/",
+        )
+
+        async def connect_and_receive_progress():
+            connected, _ = await communicator.connect()
+            await sync_to_async(tasks.send_progress)("analysis_key", "messages_found", messages=3)
+            progress = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return connected, progress
+
+        # When
+        connected, progress = async_to_sync(connect_and_receive_progress)()
+        # Then
+        self.assertTrue(connected)
+        self.assertEqual({"stage": "messages_found", "messages": 3}, progress)
+
+    def test_progress_consumer_sends_status_of_finished_analysis_on_connection(self):
+        # Given
+        analysis_cache.set_analysis("analysis_key", status="ready")
+        communicator = WebsocketCommunicator(
+            lambda scope: AnalysisProgressConsumer(dict(scope, session={"analysis_key": "analysis_key"})),
+            "/ws/analysis/progress/",
+        )
+
+        async def connect_and_receive_progress():
+            await communicator.connect()
+            progress = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return progress
+
+        # When
+        progress = async_to_sync(connect_and_receive_progress)()
+        # Then
+        self.assertEqual({"stage": "ready"}, progress)
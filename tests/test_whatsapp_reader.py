@@ -202,3 +202,75 @@ class WhatsappReaderTests(unittest.TestCase):
         chat = whatsapp.read_chat(self.WHATSAPP_EXPORT_4_DIGIT_YEAR_NAME)
         # Then
         assert_frame_equal(expected_chat, chat)
+
+    def test_parse_chat_export_in_chunks_like_read_chat(self):
+        for chat_export_name in [
+            self.WHATSAPP_EXPORT_SPLIT_LINES_WITH_BAR_NAME,
+            self.WHATSAPP_EXPORT_CONTIGUOUS_SAME_USER_MESSAGES,
+            self.WHATSAPP_EXPORT_ERROR,
+        ]:
+            with self.subTest(chat_export_name=chat_export_name):
+                # Given
+                expected_chat = whatsapp.read_chat(chat_export_name)
+                with open(chat_export_name, "rb") as chat_export:
+                    content = chat_export.read()
+                parser = whatsapp.ChatParser(batch_size=2)
+                # When
+                for start in range(0, len(content), 7):
+                    parser.feed(content[start:start + 7])
+                chat = parser.close()
+                # Then
+                assert_frame_equal(expected_chat, chat)
+
+    def test_merge_overlapping_exports_of_the_same_chat(self):
+        # Given
+        def chat(messages):
+            return pd.DataFrame(
+                [(pd.to_datetime(time), user, message) for time, user, message in messages],
+                columns=["Time", "User", "Message"],
+                index=range(1, len(messages) + 1),
+            )
+
+        first_export = chat([
+            ("2020-10-05 19:00", "Valen", "Hola"),
+            ("2020-10-05 19:01", "Bowen", "Ok"),
+            ("2020-10-05 19:01", "Bowen", "Ok"),
+            ("2020-10-05 19:03", "Ale", "Que mais"),
+        ])
+        second_export = chat([
+            ("2020-10-05 19:01", "Bowen", "Ok"),
+            ("2020-10-05 19:02", "Valen", "Bien"),
+            ("2020-10-05 19:03", "Ale", "Se eliminó este mensaje"),
+            ("2020-10-05 19:04", "Bowen", "Adiós"),
+        ])
+        expected_chat = chat([
+            ("2020-10-05 19:00", "Valen", "Hola"),
+            ("2020-10-05 19:01", "Bowen", "Ok"),
+            ("2020-10-05 19:01", "Bowen", "Ok"),
+            ("2020-10-05 19:02", "Valen", "Bien"),
+            ("2020-10-05 19:03", "Ale", "Que mais"),
+            ("2020-10-05 19:03", "Ale", "Se eliminó este mensaje"),
+            ("2020-10-05 19:04", "Bowen", "Adiós"),
+        ])
+        expected_conflicts = pd.DataFrame(
+            {
+                "Time": pd.to_datetime(["2020-10-05 19:03", "2020-10-05 19:03"]),
+                "User": ["Ale", "Ale"],
+                "Export": [0, 1],
+                "Message": ["Que mais", "Se eliminó este mensaje"],
+            },
+        )
+        # When
+        merged_chat, conflicts = whatsapp.merge_chats([first_export, second_export], collapse=False)
+        # Then
+        assert_frame_equal(expected_chat, merged_chat)
+        assert_frame_equal(expected_conflicts, conflicts)
+
+    def test_merge_exports_and_collapse_like_read_chat(self):
+        # Given
+        chat = whatsapp.read_chat(self.WHATSAPP_EXPORT_CONTIGUOUS_SAME_USER_MESSAGES, collapse=False)
+        # When
+        merged_chat, conflicts = whatsapp.merge_chats([chat.iloc[:3], chat.iloc[1:], chat])
+        # Then
+        assert_frame_equal(whatsapp.read_chat(self.WHATSAPP_EXPORT_CONTIGUOUS_SAME_USER_MESSAGES), merged_chat)
+        self.assertTrue(conflicts.empty)
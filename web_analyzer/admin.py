@@ -1,3 +1,9 @@
 from django.contrib import admin
 
-# Register your models here.
+from web_analyzer.models import Chat, Message, Participant, StoredChatExport
+
+
+admin.site.register(Chat)
+admin.site.register(Participant)
+admin.site.register(Message)
+admin.site.register(StoredChatExport)
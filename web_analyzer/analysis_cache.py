@@ -0,0 +1,66 @@
+import hashlib
+
+from django.core.cache import caches
+
+
+ANALYSIS_CACHE = "analysis"
+NODE_TRACES_FIELD = "node_traces"
+EDGE_TRACES_FIELD = "edge_traces"
+SELECTION_INDEX_FIELD = "selection_index"
+ANALYSIS_FIELDS = (NODE_TRACES_FIELD, EDGE_TRACES_FIELD, SELECTION_INDEX_FIELD)
+FIGURE_FIELD = "figure"
+EDGES_FIELD = "edges"
+NODES_FIELD = "nodes"
+TRANSITION_INDEX_FIELD = "transition_index"
+PROFILE_FIELD = "profile"
+ANALYSED_AT_FIELD = "analysed_at"
+CHAT_FIELD = "chat"
+ACTIVITY_CUBE_FIELD = "activity_cube"
+STATUS_FIELD = "status"
+STATUS_PENDING = "pending"
+STATUS_READY = "ready"
+STATUS_ERROR = "error"
+
+
+def get_cache():
+    return caches[ANALYSIS_CACHE]
+
+
+def content_hasher():
+    return hashlib.sha256()
+
+
+def chat_content_key(chat_content):
+    hasher = content_hasher()
+    hasher.update(chat_content)
+    return hasher.hexdigest()
+
+
+def set_analysis(analysis_key, **fields):
+    get_cache().set_many({_field_key(analysis_key, field): value for field, value in fields.items()})
+
+
+def get_analysis(analysis_key, *fields):
+    """Return the requested fields of a cached analysis, or None if any of them has expired or been evicted"""
+    if not analysis_key:
+        return None
+
+    field_keys = {_field_key(analysis_key, field): field for field in fields}
+    values = get_cache().get_many(field_keys.keys())
+    if len(values) < len(field_keys):
+        return None
+
+    return {field_keys[key]: value for key, value in values.items()}
+
+
+def get_status(analysis_key):
+    analysis = get_analysis(analysis_key, STATUS_FIELD)
+    return analysis[STATUS_FIELD] if analysis else None
+
+
+def delete_analysis(analysis_key, *fields):
+    get_cache().delete_many([_field_key(analysis_key, field) for field in fields])
+
+
+def _field_key(analysis_key, field):
+    return f"{analysis_key}:{field}"
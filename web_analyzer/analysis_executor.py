@@ -0,0 +1,117 @@
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+import logging
+import signal
+import threading
+
+from django.conf import settings
+
+
+logger = logging.getLogger("general")
+
+
+class AnalysisExecutorBusy(RuntimeError):
+    pass
+
+
+class AnalysisTimeout(RuntimeError):
+    pass
+
+
+class AnalysisExecutor(object):
+    """Process pool for CPU-heavy analyses run inside the web tier.
+
+    At most `max_workers` jobs run at the same time and at most `max_queued` more wait for a free worker. Submitting a
+    job when both are full raises AnalysisExecutorBusy instead of queueing it. Every job is aborted after `timeout`
+    seconds and worker processes cannot allocate more than `memory_limit` bytes.
+    """
+
+    def __init__(self, max_workers=2, max_queued=4, timeout=None, memory_limit=None):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self._slots = threading.BoundedSemaphore(max_workers + max_queued)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def submit(self, function, *args, on_done=None):
+        if not self._slots.acquire(blocking=False):
+            raise AnalysisExecutorBusy
+
+        try:
+            future = self._get_pool().submit(_run_with_timeout, self.timeout, function, *args)
+        except Exception:
+            self._slots.release()
+            raise
+
+        def job_done(done_future):
+            self._slots.release()
+            if not done_future.cancelled() and isinstance(done_future.exception(), BrokenProcessPool):
+                self._reset_pool()
+            if on_done is not None:
+                on_done(done_future)
+
+        future.add_done_callback(job_done)
+        return future
+
+    def shutdown(self, wait=True):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait)
+                self._pool = None
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers, initializer=_limit_memory, initargs=(self.memory_limit,)
+                )
+            return self._pool
+
+    def _reset_pool(self):
+        logger.warning("An analysis worker died, the process pool will be restarted")
+        with self._pool_lock:
+            self._pool = None
+
+
+def _limit_memory(memory_limit):
+    if not memory_limit:
+        return
+
+    import resource
+
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def _run_with_timeout(timeout, function, *args):
+    if not timeout:
+        return function(*args)
+
+    def raise_timeout(signum, frame):
+        raise AnalysisTimeout(f"Analysis took more than {timeout} seconds")
+
+    previous_handler = signal.signal(signal.SIGALRM, raise_timeout)
+    signal.alarm(timeout)
+    try:
+        return function(*args)
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            pool_settings = settings.ANALYSIS_POOL
+            _executor = AnalysisExecutor(
+                max_workers=pool_settings["MAX_WORKERS"],
+                max_queued=pool_settings["MAX_QUEUED"],
+                timeout=pool_settings["TIMEOUT"],
+                memory_limit=pool_settings["MEMORY_LIMIT"],
+            )
+        return _executor
@@ -0,0 +1,122 @@
+import datetime
+import json
+
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+import pandas as pd
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from src.chat_network import ChatNetwork
+from web_analyzer import analysis_cache, dash_apps, tasks
+from web_analyzer.exports import parse_time_filter
+from web_analyzer.views import is_session_analysis
+
+
+def analysis_etag(request, analysis_key):
+    """The analysis of a chat never changes, so the hash of the chat content identifies every representation of it"""
+    if analysis_cache.get_status(analysis_key) != analysis_cache.STATUS_READY:
+        return None
+    return analysis_key
+
+
+def analysis_last_modified(request, analysis_key):
+    analysis = analysis_cache.get_analysis(analysis_key, analysis_cache.ANALYSED_AT_FIELD)
+    if not analysis:
+        return None
+    return datetime.datetime.fromtimestamp(analysis[analysis_cache.ANALYSED_AT_FIELD], tz=datetime.timezone.utc)
+
+
+class SessionAnalysisView(APIView):
+    """Only serves the chat uploaded in the session of the request, like the statistics page"""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if not is_session_analysis(request, kwargs.get("analysis_key")):
+            raise NotFound(f"Chat {kwargs.get('analysis_key')} was not uploaded in this session")
+
+
+@method_decorator(condition(etag_func=analysis_etag, last_modified_func=analysis_last_modified), name="get")
+class AnalysisFieldView(SessionAnalysisView):
+    analysis_field = None
+
+    def get(self, request, analysis_key):
+        return Response(self.get_data(analysis_key))
+
+    def get_data(self, analysis_key):
+        analysis = analysis_cache.get_analysis(analysis_key, self.analysis_field)
+        if not analysis:
+            raise NotFound(f"Chat {analysis_key} has not been analysed")
+        return json.loads(analysis[self.analysis_field])
+
+
+class EdgesView(AnalysisFieldView):
+    """Edges of the whole chat or, with ?start and/or ?end, of the messages sent in that window"""
+    analysis_field = analysis_cache.EDGES_FIELD
+
+    def get_data(self, analysis_key):
+        try:
+            start = parse_time_filter(self.request.query_params.get("start"))
+            end = parse_time_filter(self.request.query_params.get("end"))
+        except ValueError as error:
+            raise ValidationError(str(error))
+        if start is None and end is None:
+            return super().get_data(analysis_key)
+
+        analysis = analysis_cache.get_analysis(analysis_key, analysis_cache.TRANSITION_INDEX_FIELD)
+        if not analysis:
+            raise NotFound(f"Chat {analysis_key} has not been analysed")
+
+        edges = ChatNetwork.get_window_directed_edges(
+            analysis[analysis_cache.TRANSITION_INDEX_FIELD],
+            start=start and timezone.make_naive(start, timezone.utc),
+            end=end and timezone.make_naive(end, timezone.utc),
+            count="count",
+            CDF=ChatNetwork.NORMALIZATION_TYPE_CDF,
+            deviations=ChatNetwork.NORMALIZATION_TYPE_DEVIATION,
+        ).reset_index()
+        return json.loads(edges.to_json(orient="records", force_ascii=False))
+
+
+class NodesView(AnalysisFieldView):
+    analysis_field = analysis_cache.NODES_FIELD
+
+
+@method_decorator(condition(etag_func=analysis_etag, last_modified_func=analysis_last_modified), name="get")
+class FigureView(SessionAnalysisView):
+    def get(self, request, analysis_key):
+        figure = dash_apps.get_figure(analysis_key)
+        if figure is None:
+            raise NotFound(f"Chat {analysis_key} has not been analysed")
+        return Response(figure)
+
+
+@method_decorator(condition(etag_func=analysis_etag, last_modified_func=analysis_last_modified), name="get")
+class TemporalNetworkView(SessionAnalysisView):
+    """Edges and node sizes of a ?window (30 days by default) moved by ?step (7 days by default) over the chat"""
+    max_windows = 2000
+
+    def get(self, request, analysis_key):
+        try:
+            window = pd.to_timedelta(request.query_params.get("window", "30D"))
+            step = pd.to_timedelta(request.query_params.get("step", "7D"))
+        except ValueError as error:
+            raise ValidationError(str(error))
+        if window <= pd.Timedelta(0) or step <= pd.Timedelta(0):
+            raise ValidationError("window and step must be positive")
+
+        chat = tasks.get_chat(analysis_key)
+        if chat is None:
+            raise NotFound(f"Chat {analysis_key} is not available")
+        if not chat.empty and (chat["Time"].max() - chat["Time"].min().floor("D")) / step > self.max_windows:
+            raise ValidationError(f"The step is too small, it would split the chat in over {self.max_windows} windows")
+
+        edges, node_sizes = ChatNetwork(chat=chat).get_temporal_network(window, step, count="count")
+        return Response({
+            "windows": [window_start.isoformat() for window_start in node_sizes.index],
+            "users": list(node_sizes.columns),
+            "node_sizes": node_sizes.values.tolist(),
+            "edges": json.loads(edges.reset_index().to_json(orient="records", date_format="iso", force_ascii=False)),
+        })
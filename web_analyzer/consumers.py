@@ -0,0 +1,33 @@
+from asgiref.sync import async_to_sync
+from channels.generic.websocket import JsonWebsocketConsumer
+
+from web_analyzer import analysis_cache
+
+
+def progress_group_name(analysis_key):
+    return f"analysis_progress_{analysis_key}"
+
+
+class AnalysisProgressConsumer(JsonWebsocketConsumer):
+    def connect(self):
+        self.analysis_key = self.scope["session"].get("analysis_key", None)
+        if not self.analysis_key:
+            self.close()
+            return
+
+        async_to_sync(self.channel_layer.group_add)(progress_group_name(self.analysis_key), self.channel_name)
+        self.accept()
+
+        # The analysis may have finished before the page opened the connection
+        analysis_status = analysis_cache.get_status(self.analysis_key)
+        if analysis_status != analysis_cache.STATUS_PENDING:
+            self.send_json({"stage": analysis_status or "missing"})
+
+    def disconnect(self, code):
+        if self.analysis_key:
+            async_to_sync(self.channel_layer.group_discard)(
+                progress_group_name(self.analysis_key), self.channel_name
+            )
+
+    def analysis_progress(self, event):
+        self.send_json(event["progress"])
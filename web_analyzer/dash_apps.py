@@ -2,16 +2,22 @@ import json
 
 import dash_core_components as dcc
 import dash_html_components as html
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 from django_plotly_dash import DjangoDash
+import plotly
 
 from src.chat_network import ChatNetwork
+from src.selection_index import SelectionIndex
+from web_analyzer import analysis_cache, metrics, tasks
 
 
 def create_app_layout(plotly_figure=None):
     return html.Div(
         [
             dcc.Graph(id="network-hot-cold", figure=plotly_figure, config={"displayModeBar": False}),
+            dcc.Store(id="network-figure"),
+            dcc.Store(id="network-selection-delta"),
         ],
         id="network-graph"
     )
@@ -21,20 +27,182 @@ app = DjangoDash('NetworkGraph')
 app.layout = create_app_layout()
 
 
+def get_figure(analysis_key):
+    """Figure of the analysis without selected nodes, drawn once and then kept in the analysis cache"""
+    analysis = analysis_cache.get_analysis(analysis_key, analysis_cache.FIGURE_FIELD)
+    if analysis:
+        return json.loads(analysis[analysis_cache.FIGURE_FIELD])
+
+    analysis = analysis_cache.get_analysis(analysis_key, *analysis_cache.ANALYSIS_FIELDS)
+    if not analysis:
+        return None
+
+    figure = ChatNetwork().draw(
+        node_traces=analysis[analysis_cache.NODE_TRACES_FIELD],
+        edge_traces=analysis[analysis_cache.EDGE_TRACES_FIELD],
+        selection_index=analysis[analysis_cache.SELECTION_INDEX_FIELD],
+        selected_nodes=[],
+    )
+    figure.update_layout(height=800)
+    figure_json = json.dumps(figure, cls=plotly.utils.PlotlyJSONEncoder)
+    analysis_cache.set_analysis(analysis_key, **{analysis_cache.FIGURE_FIELD: figure_json})
+    return json.loads(figure_json)
+
+
+# The id of the container never changes, so this callback only runs when the graph is loaded
 @app.expanded_callback(
-    Output('network-hot-cold', 'figure'),
+    Output('network-figure', 'data'),
+    [Input('network-graph', 'id')]
+    )
+@metrics.timed_callback("figure")
+def figure_callback(_, **kwargs):
+    session = kwargs["request"].session
+    analysis_key = session.get("analysis_key")
+    figure = get_figure(analysis_key)
+    analysis = analysis_cache.get_analysis(analysis_key, analysis_cache.SELECTION_INDEX_FIELD)
+    if figure is None or not analysis:
+        raise PreventUpdate
+
+    selection_index = SelectionIndex.from_json(analysis[analysis_cache.SELECTION_INDEX_FIELD])
+    delta = ChatNetwork.figure_selection_delta(selection_index, [], session.get("selected_nodes", []))
+    return ChatNetwork.apply_figure_selection_delta(figure, delta)
+
+
+@app.expanded_callback(
+    Output('network-selection-delta', 'data'),
     [Input('network-hot-cold', 'clickData')]
     )
+@metrics.timed_callback("nodes_selected")
 def nodes_selected_callback(clickData, **kwargs):
-    node_traces = kwargs["request"].session["node_traces"]
-    edge_traces = kwargs["request"].session["edge_traces"]
-    selected_nodes = kwargs["request"].session["selected_nodes"]
+    session = kwargs["request"].session
+    analysis = analysis_cache.get_analysis(session.get("analysis_key"), analysis_cache.SELECTION_INDEX_FIELD)
+    if not analysis:
+        raise PreventUpdate
 
-    if clickData:
-        clicked_node = clickData["points"][0]["customdata"]
+    selection_index = SelectionIndex.from_json(analysis[analysis_cache.SELECTION_INDEX_FIELD])
+    previous_selected_nodes = session.get("selected_nodes", [])
+    selected_nodes = list(previous_selected_nodes)
+
+    clicked_node = clickData["points"][0].get("customdata") if clickData else None
+    if clicked_node:
         if clicked_node in selected_nodes:
             selected_nodes.remove(clicked_node)
         else:
             selected_nodes.append(clicked_node)
 
-    return ChatNetwork().draw(node_traces=node_traces, edge_traces=edge_traces, selected_nodes=selected_nodes)
+    session["selected_nodes"] = selected_nodes
+
+    return ChatNetwork.figure_selection_delta(selection_index, previous_selected_nodes, selected_nodes)
+
+
+app.clientside_callback(
+    """
+    function(loadedFigure, delta, figure) {
+        const triggered = window.dash_clientside.callback_context.triggered.map(trigger => trigger.prop_id);
+        if (triggered.includes("network-figure.data")) {
+            return loadedFigure || window.dash_clientside.no_update;
+        }
+        if (!delta || !figure) {
+            return window.dash_clientside.no_update;
+        }
+        const positions = Object.keys(delta.visible).concat(Object.keys(delta.opacity));
+        if (positions.length === 0) {
+            return window.dash_clientside.no_update;
+        }
+
+        const data = figure.data.slice();
+        Object.entries(delta.visible).forEach(([position, visible]) => {
+            data[position] = Object.assign({}, data[position], {visible: visible});
+        });
+        Object.entries(delta.opacity).forEach(([position, opacity]) => {
+            const marker = Object.assign({}, data[position].marker, {opacity: opacity});
+            data[position] = Object.assign({}, data[position], {marker: marker});
+        });
+        return Object.assign({}, figure, {data: data});
+    }
+    """,
+    Output('network-hot-cold', 'figure'),
+    [Input('network-figure', 'data'), Input('network-selection-delta', 'data')],
+    [State('network-hot-cold', 'figure')],
+)
+
+
+def create_activity_app_layout():
+    return html.Div(
+        [
+            dcc.Dropdown(id="activity-user", placeholder="Whole group"),
+            dcc.Graph(id="activity-heatmap", config={"displayModeBar": False}),
+            dcc.Graph(id="activity-timeline", config={"displayModeBar": False}),
+        ],
+        id="activity"
+    )
+
+
+activity_app = DjangoDash('ActivityHeatmaps')
+activity_app.layout = create_activity_app_layout()
+
+
+def activity_heatmap(activity_cube, user=None):
+    """Messages of the user (or of the whole group) by weekday and hour of the day"""
+    import plotly.graph_objects as go
+
+    counts = activity_cube.rollup("weekday", "hour", users=[user] if user else None)
+    figure = go.Figure(
+        go.Heatmap(z=counts.values, x=list(counts.columns), y=list(counts.index), colorscale="Blues")
+    )
+    figure.update_layout(
+        title=f"Messages of {user or 'the group'} by hour",
+        xaxis={"title": "Hour", "dtick": 1},
+        yaxis={"autorange": "reversed"},
+    )
+    return figure
+
+
+def activity_timeline(activity_cube, user=None):
+    """Messages of every user by month. With a user, the lines of the others are hidden until clicked in the legend."""
+    import plotly.graph_objects as go
+
+    counts = activity_cube.rollup("month", "user")
+    months = counts.index.to_timestamp()
+    figure = go.Figure(
+        [
+            go.Scatter(
+                x=months,
+                y=counts[name],
+                mode="lines",
+                name=name,
+                visible=True if not user or name == user else "legendonly",
+            )
+            for name in counts.columns
+        ]
+    )
+    figure.update_layout(title="Messages by month", yaxis={"title": "Messages"})
+    return figure
+
+
+@activity_app.expanded_callback(
+    Output('activity-user', 'options'),
+    [Input('activity', 'id')]
+    )
+@metrics.timed_callback("activity_users")
+def activity_users_callback(_, **kwargs):
+    activity_cube = tasks.get_activity_cube(kwargs["request"].session.get("analysis_key"))
+    if activity_cube is None:
+        raise PreventUpdate
+
+    return [{"label": user, "value": user} for user in activity_cube.users]
+
+
+@activity_app.expanded_callback(
+    [Output('activity-heatmap', 'figure'), Output('activity-timeline', 'figure')],
+    [Input('activity-user', 'value')]
+    )
+@metrics.timed_callback("activity")
+def activity_callback(user, **kwargs):
+    activity_cube = tasks.get_activity_cube(kwargs["request"].session.get("analysis_key"))
+    if activity_cube is None:
+        raise PreventUpdate
+
+    if user not in activity_cube.users:
+        user = None
+    return activity_heatmap(activity_cube, user), activity_timeline(activity_cube, user)
@@ -0,0 +1,153 @@
+import zlib
+
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.generic import View
+import pandas as pd
+
+from src import whatsapp
+from src.chat_network import ChatNetwork
+from web_analyzer import analysis_cache
+from web_analyzer.models import Chat
+from web_analyzer.views import is_session_analysis
+
+
+EXPORT_BATCH_SIZE = 10000
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def dataframe_batches(table, batch_size=EXPORT_BATCH_SIZE):
+    for start in range(0, len(table), batch_size):
+        yield table.iloc[start:start + batch_size]
+
+
+def csv_chunks(batches, columns):
+    yield pd.DataFrame(columns=columns).to_csv(index=False)
+    for batch in batches:
+        yield batch.to_csv(header=False, index=False)
+
+
+def ndjson_chunks(batches, columns):
+    for batch in batches:
+        if batch.empty:
+            continue
+        yield batch.to_json(orient="records", lines=True, date_format="iso", force_ascii=False).rstrip("\n") + "\n"
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=GZIP_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode("utf-8"))
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def parse_time_filter(value):
+    if not value:
+        return None
+
+    time = parse_datetime(value)
+    if time is None:
+        raise ValueError(f"{value} is not a valid date and time")
+    return time if timezone.is_aware(time) else timezone.make_aware(time, timezone.utc)
+
+
+EXPORT_FORMATS = {
+    "csv": (csv_chunks, "text/csv"),
+    "ndjson": (ndjson_chunks, "application/x-ndjson"),
+}
+
+
+def filter_chat(chat, start=None, end=None, users=None):
+    """Messages of a parsed chat between `start` and `end` (aware datetimes) and by `users`, like
+    `Chat.to_dataframe`"""
+    if start is not None:
+        chat = chat.loc[chat["Time"] >= timezone.make_naive(start, timezone.utc)]
+    if end is not None:
+        chat = chat.loc[chat["Time"] < timezone.make_naive(end, timezone.utc)]
+    if users:
+        chat = chat.loc[chat["User"].isin(users)]
+    return chat
+
+
+class TableExportView(View):
+    """Stream a table of the chat uploaded in the session batch by batch, gzipped on the fly with ?compression=gzip.
+
+    The table can be narrowed down to the messages between ?start and ?end by the given ?user.
+    """
+    table_name = None
+
+    def get_batches(self, stored_chat, chat, start, end, users):
+        """Columns and batches of the table, from the chat stored in the database or else from the parsed chat"""
+        raise NotImplementedError
+
+    def get(self, request, analysis_key, export_format):
+        if export_format not in EXPORT_FORMATS:
+            raise Http404(f"Unknown export format {export_format}")
+        if not is_session_analysis(request, analysis_key):
+            raise Http404(f"Chat {analysis_key} was not uploaded in this session")
+
+        try:
+            start = parse_time_filter(request.GET.get("start"))
+            end = parse_time_filter(request.GET.get("end"))
+        except ValueError as error:
+            return HttpResponseBadRequest(str(error))
+
+        stored_chat = Chat.objects.filter(content_hash=analysis_key).first()
+        chat = None
+        if stored_chat is None:
+            analysis = analysis_cache.get_analysis(analysis_key, analysis_cache.CHAT_FIELD)
+            if not analysis:
+                raise Http404(f"Chat {analysis_key} is not available")
+            chat = analysis[analysis_cache.CHAT_FIELD]
+
+        serializer, content_type = EXPORT_FORMATS[export_format]
+        columns, batches = self.get_batches(stored_chat, chat, start, end, request.GET.getlist("user"))
+        chunks = serializer(batches, columns)
+        file_name = f"{self.table_name}.{export_format}"
+        if request.GET.get("compression") == "gzip":
+            chunks = gzip_chunks(chunks)
+            content_type = "application/gzip"
+            file_name += ".gz"
+
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{file_name}"'
+        return response
+
+
+class MessagesExportView(TableExportView):
+    """Messages stored in the database are read in batches, so the chat is never loaded as a whole"""
+    table_name = "messages"
+
+    def get_batches(self, stored_chat, chat, start, end, users):
+        if stored_chat is not None:
+            batches = stored_chat.message_batches(start, end, users, batch_size=EXPORT_BATCH_SIZE)
+        else:
+            messages = filter_chat(chat, start, end, users)[whatsapp.MESSAGE_COMPONENTS]
+            batches = dataframe_batches(messages, batch_size=EXPORT_BATCH_SIZE)
+        return whatsapp.MESSAGE_COMPONENTS, batches
+
+
+class EdgesExportView(TableExportView):
+    """Edges of the replies between the messages of the window. With ?user, only the edges from or to those users:
+    the replies are found in the whole window, so messages of other users still separate the given ones."""
+    table_name = "edges"
+
+    def get_batches(self, stored_chat, chat, start, end, users):
+        chat = stored_chat.to_dataframe(start, end) if stored_chat is not None else filter_chat(chat, start, end)
+        weights = {
+            "count": "count",
+            "CDF": ChatNetwork.NORMALIZATION_TYPE_CDF,
+            "deviations": ChatNetwork.NORMALIZATION_TYPE_DEVIATION,
+        }
+        directed_edges = ChatNetwork(chat=chat).get_directed_edges()
+        if directed_edges.empty:
+            # The MLE weighting cannot be fitted without replies, so a window without them is just the header
+            return ["Source", "Target", *weights], iter(())
+
+        edges = ChatNetwork.directed_edges_to_weighted(directed_edges, **weights).reset_index()
+        if users:
+            edges = edges.loc[edges["Source"].isin(users) | edges["Target"].isin(users)]
+        return list(edges.columns), dataframe_batches(edges, batch_size=EXPORT_BATCH_SIZE)
@@ -0,0 +1,274 @@
+"""Metrics of the web tier, exposed in the Prometheus text format.
+
+The samples are counters kept in the metrics cache, which the web workers and the analysis workers (Celery or the
+process pool) share, so the /metrics endpoint of any web worker reports all of them. Histograms keep one counter per
+bucket and the sum of the observations in millionths.
+
+The counters are only exact on Redis, whose `add` and `incr` are atomic. On other backends, like the file based cache
+of the base settings, they are a get followed by a set, so concurrent workers can lose increments and two new series
+can take the same slot: the counts are best effort there.
+"""
+import bisect
+import contextlib
+import functools
+import logging
+import time
+
+from django.core.cache import caches
+from django.http import HttpResponse
+
+
+logger = logging.getLogger("general")
+
+
+METRICS_CACHE = "metrics"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+SUM_SCALE = 1000000
+
+BYTES_BUCKETS = (1000, 10000, 100000, 1000000, 10000000, 100000000)
+MESSAGES_BUCKETS = (100, 1000, 10000, 100000, 1000000)
+PARTICIPANTS_BUCKETS = (2, 5, 10, 20, 50, 100, 250)
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Upper bound (included) and label of the group sizes analysis latencies are split by
+GROUP_SIZES = ((2, "2"), (5, "3-5"), (10, "6-10"), (20, "11-20"), (50, "21-50"), (100, "51-100"))
+LARGEST_GROUP_SIZE = "101+"
+
+REGISTRY = []
+
+
+def get_cache():
+    return caches[METRICS_CACHE]
+
+
+def group_size(participants):
+    for upper_bound, label in GROUP_SIZES:
+        if participants <= upper_bound:
+            return label
+    return LARGEST_GROUP_SIZE
+
+
+def _increment(cache, key, delta=1):
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, timeout=None)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(object):
+    type = None
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        REGISTRY.append(self)
+
+    def _label_values(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} takes the labels {self.label_names}, not {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _key(self, label_values, *suffix):
+        return ":".join(("metrics", self.name) + label_values + suffix)
+
+    @property
+    def _series_count_key(self):
+        return f"metrics-series:{self.name}"
+
+    def _series_slot_key(self, slot):
+        return f"metrics-series:{self.name}:{slot}"
+
+    def _register(self, cache, label_values):
+        """Give a new series its own slot. Only the first observation adds the registration flag, and the slot number
+        comes from an increment, so on Redis concurrent first observations of different series cannot overwrite each
+        other."""
+        if not cache.add(self._key(label_values, "registered"), True, timeout=None):
+            return
+        cache.add(self._series_count_key, 0, timeout=None)
+        slot = cache.incr(self._series_count_key)
+        cache.set(self._series_slot_key(slot), label_values, timeout=None)
+
+    def _record(self, label_values, increments):
+        """Add the increments (suffix -> delta) to the counters of the series. Metrics are best effort: a failing
+        cache is logged and never breaks the request that is measured."""
+        try:
+            cache = get_cache()
+            self._register(cache, label_values)
+            for suffix, delta in increments.items():
+                _increment(cache, self._key(label_values, *suffix), delta)
+        except Exception:
+            logger.warning(f"Metric {self.name} could not be recorded", exc_info=True)
+
+    def series(self, cache):
+        slot_keys = [self._series_slot_key(slot) for slot in range(1, cache.get(self._series_count_key, 0) + 1)]
+        series = cache.get_many(slot_keys)
+        return [dict(zip(self.label_names, series[slot_key])) for slot_key in slot_keys if slot_key in series]
+
+    def samples(self, cache):
+        """(name, labels, value) of every sample"""
+        raise NotImplementedError
+
+    def render(self, cache):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for name, labels, value in self.samples(cache):
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        self._record(self._label_values(labels), {(): amount})
+
+    def value(self, cache, **labels):
+        return cache.get(self._key(self._label_values(labels)), 0)
+
+    def samples(self, cache):
+        for labels in self.series(cache):
+            yield f"{self.name}_total", labels, self.value(cache, **labels)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, buckets, label_names=()):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        # Only the bucket of the value is incremented, the cumulative counts are added up when rendering
+        bucket = bisect.bisect_left(self.buckets, value)
+        self._record(
+            self._label_values(labels),
+            {("bucket", str(bucket)): 1, ("sum",): int(round(value * SUM_SCALE))},
+        )
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self, cache):
+        for labels in self.series(cache):
+            label_values = self._label_values(labels)
+            bucket_keys = [self._key(label_values, "bucket", str(bucket)) for bucket in range(len(self.buckets))]
+            sum_key = self._key(label_values, "sum")
+            counters = cache.get_many(bucket_keys + [sum_key])
+
+            count = 0
+            for upper_bound, bucket_key in zip(self.buckets, bucket_keys):
+                count += counters.get(bucket_key, 0)
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(upper_bound)}, count
+            yield f"{self.name}_sum", labels, counters.get(sum_key, 0) / SUM_SCALE
+            yield f"{self.name}_count", labels, count
+
+
+UPLOAD_BYTES = Histogram("whatsapp_upload_bytes", "Size of the uploaded chat exports.", BYTES_BUCKETS)
+UPLOAD_MESSAGES = Histogram("whatsapp_upload_messages", "Messages of the uploaded chats.", MESSAGES_BUCKETS)
+UPLOAD_PARTICIPANTS = Histogram(
+    "whatsapp_upload_participants", "Participants of the uploaded chats.", PARTICIPANTS_BUCKETS
+)
+ANALYSIS_SECONDS = Histogram(
+    "whatsapp_analysis_seconds", "Time to analyse a chat, by group size.", SECONDS_BUCKETS, ["group_size"]
+)
+ANALYSIS_STAGE_SECONDS = Histogram(
+    "whatsapp_analysis_stage_seconds",
+    "Time spent in each stage of a chat analysis, by group size.",
+    SECONDS_BUCKETS,
+    ["stage", "group_size"],
+)
+ANALYSES = Counter("whatsapp_analyses", "Finished chat analyses, by status.", ["status"])
+DASH_CALLBACK_SECONDS = Histogram(
+    "whatsapp_dash_callback_seconds", "Time to run the Dash callbacks.", SECONDS_BUCKETS, ["callback"]
+)
+SESSION_BYTES = Histogram("whatsapp_session_bytes", "Size of the saved session data.", BYTES_BUCKETS)
+ANALYSIS_CACHE_LOOKUPS = Counter(
+    "whatsapp_analysis_cache_lookups", "Lookups of uploaded chats in the analysis cache, by result.", ["result"]
+)
+
+
+def timed_callback(name):
+    """Observe the time of every call of the decorated Dash callback, also of those that prevent the update"""
+    def decorator(callback):
+        @functools.wraps(callback)
+        def wrapper(*args, **kwargs):
+            with DASH_CALLBACK_SECONDS.time(callback=name):
+                return callback(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def record_upload(upload_size, chat):
+    UPLOAD_BYTES.observe(upload_size)
+    UPLOAD_MESSAGES.observe(len(chat))
+    UPLOAD_PARTICIPANTS.observe(chat["User"].nunique())
+
+
+def record_analysis(seconds, profile, participants):
+    """Observe the time of an analysis and of each of its stages, as recorded by `src.profiling.profiling`"""
+    size = group_size(participants)
+    ANALYSIS_SECONDS.observe(seconds, group_size=size)
+    for stage in profile.stages.values():
+        ANALYSIS_STAGE_SECONDS.observe(stage.wall_time, stage=stage.name, group_size=size)
+
+
+def record_analysis_cache_lookup(hit):
+    ANALYSIS_CACHE_LOOKUPS.inc(result="hit" if hit else "miss")
+
+
+def analysis_cache_lookup_statistics(cache=None):
+    """Hits, misses and hit ratio of the lookups in the analysis cache. They are kept in the metrics cache, because
+    the analysis cache culls its entries."""
+    cache = cache or get_cache()
+    hits = ANALYSIS_CACHE_LOOKUPS.value(cache, result="hit")
+    misses = ANALYSIS_CACHE_LOOKUPS.value(cache, result="miss")
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / (hits + misses) if hits + misses else 0,
+    }
+
+
+def _analysis_cache_lines(cache):
+    hit_ratio = float(analysis_cache_lookup_statistics(cache)["hit_ratio"])
+    return [
+        "# HELP whatsapp_analysis_cache_hit_ratio Share of the uploaded chats found in the analysis cache.",
+        "# TYPE whatsapp_analysis_cache_hit_ratio gauge",
+        f"whatsapp_analysis_cache_hit_ratio {_format_value(hit_ratio)}",
+    ]
+
+
+def render():
+    cache = get_cache()
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render(cache)
+    lines += _analysis_cache_lines(cache)
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
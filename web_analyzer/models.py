@@ -1,3 +1,131 @@
-from django.db import models
+import itertools
 
-# Create your models here.
+from django.db import models, transaction
+import pandas as pd
+
+
+MESSAGES_BATCH_SIZE = 5000
+
+
+class ChatManager(models.Manager):
+    def load(self, content_hash, chat, name="", batch_size=MESSAGES_BATCH_SIZE):
+        """Store a parsed chat (as returned by `whatsapp.read_chat`) inserting its messages in batches"""
+        with transaction.atomic():
+            stored_chat = self.create(content_hash=content_hash, name=name)
+            Participant.objects.bulk_create(
+                [Participant(chat=stored_chat, name=user) for user in chat["User"].unique()]
+            )
+            participant_ids = dict(stored_chat.participants.values_list("name", "id"))
+
+            for start in range(0, len(chat), batch_size):
+                batch = chat.iloc[start:start + batch_size]
+                Message.objects.bulk_create(
+                    [
+                        Message(
+                            chat=stored_chat,
+                            user_id=participant_ids[user],
+                            position=position,
+                            time=time,
+                            text=text,
+                        )
+                        for position, time, user, text in zip(
+                            batch.index,
+                            batch["Time"].dt.tz_localize("UTC").dt.to_pydatetime(),
+                            batch["User"],
+                            batch["Message"],
+                        )
+                    ],
+                    batch_size=batch_size,
+                )
+
+        return stored_chat
+
+
+class Chat(models.Model):
+    content_hash = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ChatManager()
+
+    def __str__(self):
+        return self.name or self.content_hash
+
+    def filtered_messages(self, start=None, end=None, users=None):
+        """Messages in order, optionally only those between `start` and `end` or by `users`"""
+        messages = self.messages.all()
+        if start is not None:
+            messages = messages.filter(time__gte=start)
+        if end is not None:
+            messages = messages.filter(time__lt=end)
+        if users:
+            messages = messages.filter(user__name__in=users)
+        return messages.order_by("position")
+
+    def to_dataframe(self, start=None, end=None, users=None):
+        """Messages in the format of `whatsapp.read_chat`, optionally only those between `start` and `end` or by
+        `users`"""
+        messages = self.filtered_messages(start, end, users)
+        return self._records_to_dataframe(
+            messages.values_list("position", "time", "user__name", "text"), ["Time", "User", "Message"]
+        )
+
+    def message_batches(self, start=None, end=None, users=None, batch_size=MESSAGES_BATCH_SIZE):
+        """Time, user and text of the messages (filtered like `to_dataframe`), in tables of up to `batch_size` read
+        from the database one after the other, so only one batch is in memory at a time"""
+        records = self.filtered_messages(start, end, users).values_list("position", "time", "user__name", "text")
+        records = records.iterator(chunk_size=batch_size)
+        while True:
+            batch = list(itertools.islice(records, batch_size))
+            if not batch:
+                return
+            yield self._records_to_dataframe(batch, ["Time", "User", "Message"])
+
+    @classmethod
+    def _records_to_dataframe(cls, records, columns):
+        """Table of (position, *columns) records, indexed by position"""
+        chat = pd.DataFrame.from_records(records, columns=["position"] + columns, index="position")
+        chat = chat.rename_axis(index=None)
+        chat["Time"] = pd.to_datetime(chat["Time"], utc=True).dt.tz_localize(None)
+        return chat
+
+
+class Participant(models.Model):
+    chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name="participants")
+    name = models.CharField(max_length=255)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["chat", "name"], name="unique_participant_per_chat"),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class Message(models.Model):
+    chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name="messages")
+    user = models.ForeignKey(Participant, on_delete=models.CASCADE, related_name="messages")
+    position = models.PositiveIntegerField()
+    time = models.DateTimeField()
+    text = models.TextField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["chat", "time"], name="message_chat_time_idx"),
+            models.Index(fields=["chat", "user"], name="message_chat_user_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} ({self.time}): {self.text}"
+
+
+class StoredChatExport(models.Model):
+    """Bookkeeping of a compressed chat export in the upload storage (see `web_analyzer.upload_storage`)"""
+    content_hash = models.CharField(max_length=64, unique=True)
+    size = models.PositiveBigIntegerField()
+    references = models.PositiveIntegerField(default=0)
+    last_used = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.content_hash
@@ -0,0 +1,25 @@
+from django.core.signing import JSONSerializer
+import msgpack
+
+from web_analyzer import metrics
+
+
+class MessagePackSerializer(object):
+    """Session serializer that stores the session data as MessagePack, so long strings are kept as they are instead
+    of being escaped as JSON. Django compresses the payload with zlib before signing it. Sessions saved with the JSON
+    serializer can still be read.
+
+    Sessions are only serialized when they are saved, so the size of every saved session is observed here.
+    """
+
+    def dumps(self, obj):
+        data = msgpack.packb(obj, use_bin_type=True)
+        metrics.SESSION_BYTES.observe(len(data))
+        return data
+
+    def loads(self, data):
+        try:
+            return msgpack.unpackb(data, raw=False)
+        except ValueError:
+            # A JSON object starts with "{", which MessagePack reads as an integer followed by extra data
+            return JSONSerializer().loads(data)
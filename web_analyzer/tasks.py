@@ -0,0 +1,189 @@
+import logging
+import time
+
+from asgiref.sync import async_to_sync
+from celery import shared_task
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import connection, IntegrityError
+
+from src import profiling, progress, whatsapp
+from src.activity_cube import ActivityCube
+from src.chat_network import ChatNetwork
+from web_analyzer import analysis_cache, analysis_executor, metrics, upload_storage
+from web_analyzer.consumers import progress_group_name
+from web_analyzer.models import Chat
+
+
+logger = logging.getLogger("general")
+
+
+CELERY_EXECUTOR = "celery"
+# Seconds between two progress reports of the same stage, like the iterations of the optimizer
+PROGRESS_REPORT_INTERVAL = 0.5
+PROCESS_POOL_EXECUTOR = "process_pool"
+
+
+def submit_analysis(analysis_key, chat, chat_name=""):
+    if settings.ANALYSIS_EXECUTOR == PROCESS_POOL_EXECUTOR:
+        submit_analysis_to_process_pool(analysis_key, chat, chat_name)
+        return
+
+    analysis_cache.set_analysis(
+        analysis_key,
+        **{
+            analysis_cache.CHAT_FIELD: chat,
+            analysis_cache.STATUS_FIELD: analysis_cache.STATUS_PENDING,
+        }
+    )
+    analyse_chat.delay(analysis_key, chat_name)
+
+
+def submit_analysis_to_process_pool(analysis_key, chat, chat_name=""):
+    def analysis_done(future):
+        try:
+            analysis = future.result()
+        except Exception:
+            logger.exception(f"Chat {analysis_key} could not be analysed")
+            finish_analysis(analysis_key, analysis_cache.STATUS_ERROR)
+            return
+
+        # The callback runs in a thread of the executor, which has to close the database connection it opens
+        store_chat(analysis_key, chat, chat_name)
+        connection.close()
+        save_analysis(analysis_key, analysis)
+
+    analysis_cache.set_analysis(
+        analysis_key,
+        **{
+            analysis_cache.CHAT_FIELD: chat,
+            analysis_cache.STATUS_FIELD: analysis_cache.STATUS_PENDING,
+        }
+    )
+    try:
+        analysis_executor.get_executor().submit(compute_analysis, chat, on_done=analysis_done)
+    except analysis_executor.AnalysisExecutorBusy:
+        analysis_cache.delete_analysis(analysis_key, analysis_cache.CHAT_FIELD, analysis_cache.STATUS_FIELD)
+        raise
+
+
+def compute_analysis(chat):
+    """Analyse the chat, recording the time of its stages in the metrics. With ANALYSIS_PROFILING the memory of the
+    stages is traced too and the profile is logged and kept with the analysis."""
+    start = time.perf_counter()
+    with profiling.profiling(trace_memory=settings.ANALYSIS_PROFILING) as profile:
+        analysis = analyse(chat)
+    metrics.record_analysis(time.perf_counter() - start, profile, chat["User"].nunique())
+    if not settings.ANALYSIS_PROFILING:
+        return analysis
+
+    profile_report = profile.report()
+    logger.info(f"Analysis profile of a chat with {len(chat)} messages:\n{profile_report}")
+    return {**analysis, analysis_cache.PROFILE_FIELD: profile_report}
+
+
+def analyse(chat):
+    chat_network = ChatNetwork(chat=chat)
+    _, node_traces, edge_traces, selection_index = chat_network.draw(return_traces=True)
+    edges, nodes = chat_network.get_statistics()
+    return {
+        analysis_cache.NODE_TRACES_FIELD: node_traces,
+        analysis_cache.EDGE_TRACES_FIELD: edge_traces,
+        analysis_cache.SELECTION_INDEX_FIELD: selection_index,
+        analysis_cache.EDGES_FIELD: edges.to_json(orient="records", force_ascii=False),
+        analysis_cache.NODES_FIELD: nodes.to_json(orient="records", force_ascii=False),
+        analysis_cache.TRANSITION_INDEX_FIELD: chat_network.get_transition_index(),
+    }
+
+
+def send_progress(analysis_key, stage, **info):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    try:
+        async_to_sync(channel_layer.group_send)(
+            progress_group_name(analysis_key),
+            {"type": "analysis.progress", "progress": {"stage": stage, **info}},
+        )
+    except Exception as error:
+        logger.warning(f"Progress of chat {analysis_key} could not be sent: {error!r}")
+
+
+def store_chat(analysis_key, chat, chat_name=""):
+    """Keep the chat in the database for the exports and for analysing it again once it expires from the analysis
+    cache. It inserts every message, so it runs with the analysis instead of in the upload request. A chat that could
+    not be stored is still analysed."""
+    try:
+        if not Chat.objects.filter(content_hash=analysis_key).exists():
+            Chat.objects.load(analysis_key, chat, name=chat_name)
+    except IntegrityError:
+        logger.info(f"Chat {analysis_key} was stored by a concurrent analysis")
+    except Exception:
+        logger.warning(f"Chat {analysis_key} could not be stored in the database", exc_info=True)
+
+
+@shared_task(ignore_result=True)
+def analyse_chat(analysis_key, chat_name=""):
+    chat = get_chat(analysis_key)
+    if chat is None:
+        logger.warning(f"Chat {analysis_key} is no longer available for analysis")
+        finish_analysis(analysis_key, analysis_cache.STATUS_ERROR)
+        return
+
+    try:
+        with progress.reporting(
+            lambda stage, **info: send_progress(analysis_key, stage, **info), min_interval=PROGRESS_REPORT_INTERVAL
+        ):
+            progress.report("messages_found", messages=len(chat))
+            analysis = compute_analysis(chat)
+    except Exception:
+        logger.exception(f"Chat {analysis_key} could not be analysed")
+        finish_analysis(analysis_key, analysis_cache.STATUS_ERROR)
+        return
+
+    store_chat(analysis_key, chat, chat_name)
+    save_analysis(analysis_key, analysis)
+
+
+def get_chat(analysis_key):
+    """Parsed chat from the analysis cache or, once it has expired there, from the database or the upload storage"""
+    analysis = analysis_cache.get_analysis(analysis_key, analysis_cache.CHAT_FIELD)
+    if analysis:
+        return analysis[analysis_cache.CHAT_FIELD]
+
+    stored_chat = Chat.objects.filter(content_hash=analysis_key).first()
+    if stored_chat:
+        return stored_chat.to_dataframe()
+
+    storage = upload_storage.get_storage()
+    if not storage.exists(analysis_key):
+        return None
+    with storage.open(analysis_key) as chat_export:
+        return whatsapp.read_chat(chat_file=chat_export)
+
+
+def get_activity_cube(analysis_key):
+    """Activity cube built when the chat was uploaded or, once it has expired in the analysis cache, built again from
+    the chat"""
+    analysis = analysis_cache.get_analysis(analysis_key, analysis_cache.ACTIVITY_CUBE_FIELD)
+    if analysis:
+        return analysis[analysis_cache.ACTIVITY_CUBE_FIELD]
+
+    chat = get_chat(analysis_key)
+    if chat is None:
+        return None
+    activity_cube = ActivityCube.from_chat(chat)
+    analysis_cache.set_analysis(analysis_key, **{analysis_cache.ACTIVITY_CUBE_FIELD: activity_cube})
+    return activity_cube
+
+
+def save_analysis(analysis_key, analysis):
+    analysis_cache.set_analysis(analysis_key, **analysis, **{analysis_cache.ANALYSED_AT_FIELD: time.time()})
+    finish_analysis(analysis_key, analysis_cache.STATUS_READY)
+
+
+def finish_analysis(analysis_key, status):
+    analysis_cache.set_analysis(analysis_key, **{analysis_cache.STATUS_FIELD: status})
+    metrics.ANALYSES.inc(status=status)
+    send_progress(analysis_key, status)
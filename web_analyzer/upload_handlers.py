@@ -0,0 +1,97 @@
+import io
+
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+from src import whatsapp
+from src.activity_cube import ActivityCube
+from web_analyzer import analysis_cache, upload_storage
+
+
+class ParsedChatFile(UploadedFile):
+    """Chat export parsed while it was uploaded, with the activity cube of its messages. The raw content is only kept
+    compressed by `export_writer`, until it is saved in the upload storage or the file is closed."""
+
+    def __init__(
+        self,
+        name,
+        content_type,
+        size,
+        charset,
+        content_hash,
+        chat=None,
+        activity_cube=None,
+        parse_error=None,
+        export_writer=None,
+    ):
+        super().__init__(io.BytesIO(), name, content_type, size, charset)
+        self.content_hash = content_hash
+        self.chat = chat
+        self.activity_cube = activity_cube
+        self.parse_error = parse_error
+        self.export_writer = export_writer
+
+    def close(self):
+        super().close()
+        if self.export_writer is not None:
+            self.export_writer.discard()
+
+
+class ChatParsingUploadHandler(FileUploadHandler):
+    """Hash, parse and compress the chat export of `field_name` chunk by chunk, as the request body arrives"""
+
+    def __init__(self, request=None, field_name="chat_file"):
+        super().__init__(request)
+        self.chat_field_name = field_name
+        self.activated = False
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.activated = field_name == self.chat_field_name
+        if self.activated:
+            self.content_hasher = analysis_cache.content_hasher()
+            self.parser = whatsapp.ChatParser()
+            self.parse_error = None
+            self.export_writer = upload_storage.get_storage().writer()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.activated:
+            return raw_data
+
+        self.content_hasher.update(raw_data)
+        self.export_writer.write(raw_data)
+        if self.parse_error is None:
+            try:
+                self.parser.feed(raw_data)
+            except Exception as error:
+                self.parse_error = error
+
+    def upload_interrupted(self):
+        if self.activated:
+            self.export_writer.discard()
+
+    def file_complete(self, file_size):
+        if not self.activated:
+            return None
+
+        self.export_writer.close()
+        chat = None
+        activity_cube = None
+        if self.parse_error is None:
+            try:
+                chat = self.parser.close()
+                activity_cube = ActivityCube.from_chat(chat)
+            except Exception as error:
+                self.parse_error = error
+
+        return ParsedChatFile(
+            name=self.file_name,
+            content_type=self.content_type,
+            size=file_size,
+            charset=self.charset,
+            content_hash=self.content_hasher.hexdigest(),
+            chat=chat,
+            activity_cube=activity_cube,
+            parse_error=self.parse_error,
+            export_writer=self.export_writer,
+        )
@@ -0,0 +1,143 @@
+"""Uploaded chat exports, gzip compressed and named by the hash of their content.
+
+The hash is the key of the analysis cache and `Chat.content_hash`, so two uploads of the same chat are stored once
+whatever their file names, and the parsed chat, its analysis and its export are all found by the same key. Every
+session holds a reference to the export it uploaded last. When the stored exports take more than `max_bytes`, the
+least recently used ones that no session references are deleted, together with the chat stored in the database from
+them.
+"""
+import datetime
+import gzip
+import logging
+import os
+from pathlib import Path
+import tempfile
+
+from django.conf import settings
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from web_analyzer.models import Chat, StoredChatExport
+
+
+logger = logging.getLogger("general")
+
+
+class ChatExportWriter(object):
+    """Compress an export into a temporary file of the storage as it is uploaded, before its hash is known"""
+
+    def __init__(self, storage):
+        storage.temporary_location.mkdir(parents=True, exist_ok=True)
+        file_descriptor, path = tempfile.mkstemp(suffix=".txt.gz", dir=storage.temporary_location)
+        self.path = Path(path)
+        self._file = os.fdopen(file_descriptor, "wb")
+        self._compressed = gzip.GzipFile(fileobj=self._file, mode="wb")
+
+    def write(self, data):
+        self._compressed.write(data)
+
+    def close(self):
+        self._compressed.close()
+        self._file.close()
+
+    def discard(self):
+        self.close()
+        if self.path.is_file():
+            os.remove(self.path)
+
+
+class UploadStorage(object):
+    def __init__(self, location, max_bytes, reference_timeout=None):
+        """References older than `reference_timeout` seconds (by default, the age of the session cookie) belong to
+        sessions that have expired, so they do not keep exports from being evicted"""
+        self.location = Path(location)
+        self.temporary_location = self.location / "tmp"
+        self.max_bytes = max_bytes
+        self.reference_timeout = reference_timeout if reference_timeout is not None else settings.SESSION_COOKIE_AGE
+
+    def path(self, content_hash):
+        return self.location / content_hash[:2] / f"{content_hash}.txt.gz"
+
+    def writer(self):
+        return ChatExportWriter(self)
+
+    def save(self, content_hash, writer):
+        """Move the export compressed by `writer` under its hash, unless it is already stored, and acquire a reference
+        to it for the uploader. The reference is taken before the file is moved, so a concurrent `evict` cannot delete
+        the export in between."""
+        writer.close()
+        stored_export, created = StoredChatExport.objects.get_or_create(
+            content_hash=content_hash,
+            defaults={"size": writer.path.stat().st_size, "references": 1, "last_used": timezone.now()},
+        )
+        if not created:
+            self.acquire(content_hash)
+
+        path = self.path(content_hash)
+        if path.is_file():
+            writer.discard()
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(writer.path, path)
+
+    def exists(self, content_hash):
+        return self.path(content_hash).is_file()
+
+    def open(self, content_hash):
+        """Decompressed text of a stored export"""
+        StoredChatExport.objects.filter(content_hash=content_hash).update(last_used=timezone.now())
+        return gzip.open(self.path(content_hash), "rt", encoding="utf8")
+
+    def acquire(self, content_hash):
+        StoredChatExport.objects.filter(content_hash=content_hash).update(
+            references=F("references") + 1, last_used=timezone.now()
+        )
+
+    def release(self, content_hash):
+        StoredChatExport.objects.filter(content_hash=content_hash, references__gt=0).update(
+            references=F("references") - 1
+        )
+
+    def total_bytes(self):
+        return StoredChatExport.objects.aggregate(total=Sum("size"))["total"] or 0
+
+    def evict(self):
+        """Delete the least recently used unreferenced exports until the rest fit in `max_bytes`. Returns the hashes
+        of the deleted exports.
+
+        The chats stored in the database from the deleted exports are deleted too, since they take more space than the
+        compressed exports. A chat uploaded again is stored again by its analysis.
+        """
+        total_bytes = self.total_bytes()
+        if total_bytes <= self.max_bytes:
+            return []
+
+        references_expired_at = timezone.now() - datetime.timedelta(seconds=self.reference_timeout)
+        evictable = StoredChatExport.objects.filter(
+            Q(references=0) | Q(last_used__lt=references_expired_at)
+        ).order_by("last_used")
+
+        evicted = []
+        for stored_export in evictable.iterator():
+            if total_bytes <= self.max_bytes:
+                break
+            # The row is only deleted if nobody acquired the export since it was selected
+            deleted, _ = evictable.filter(pk=stored_export.pk).delete()
+            if not deleted:
+                continue
+            try:
+                os.remove(self.path(stored_export.content_hash))
+            except FileNotFoundError:
+                pass
+            total_bytes -= stored_export.size
+            evicted.append(stored_export.content_hash)
+
+        Chat.objects.filter(content_hash__in=evicted).delete()
+
+        if total_bytes > self.max_bytes:
+            logger.warning(f"Stored chat exports take {total_bytes} bytes, but they are all referenced by sessions")
+        return evicted
+
+
+def get_storage():
+    return UploadStorage(settings.UPLOAD_STORAGE["LOCATION"], settings.UPLOAD_STORAGE["MAX_BYTES"])
@@ -1,9 +1,26 @@
 from django.urls import path
 
+from . import api, dash_apps, exports, metrics  # noqa: F401 dash_apps registers the Dash apps
 from . import views
 
 urlpatterns = [
     path('', views.HomeView.as_view(), name='home'),
     path('upload_chat/', views.UploadChatView.as_view(), name='upload_chat'),
     path('stats/', views.ChatStatisticsView.as_view(), name='chat_statistics'),
+    path('stats/status/', views.AnalysisStatusView.as_view(), name='analysis_status'),
+    path('api/chats/<str:analysis_key>/edges/', api.EdgesView.as_view(), name='api_edges'),
+    path('api/chats/<str:analysis_key>/nodes/', api.NodesView.as_view(), name='api_nodes'),
+    path('api/chats/<str:analysis_key>/figure/', api.FigureView.as_view(), name='api_figure'),
+    path('api/chats/<str:analysis_key>/temporal/', api.TemporalNetworkView.as_view(), name='api_temporal'),
+    path(
+        'api/chats/<str:analysis_key>/messages.<str:export_format>',
+        exports.MessagesExportView.as_view(),
+        name='export_messages',
+    ),
+    path(
+        'api/chats/<str:analysis_key>/edges.<str:export_format>',
+        exports.EdgesExportView.as_view(),
+        name='export_edges',
+    ),
+    path('metrics', metrics.metrics_view, name='metrics'),
 ]
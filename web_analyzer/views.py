@@ -1,24 +1,30 @@
-import io
 import logging
-import os
-from pathlib import Path
 
+from django.http import JsonResponse
 from django.shortcuts import redirect
 from django.urls import reverse_lazy, reverse
-from django.views.generic import FormView, TemplateView, RedirectView
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.generic import FormView, TemplateView, RedirectView, View
 
-from src.chat_network import ChatNetwork
-from web_analyzer import dash_apps
+from web_analyzer import analysis_cache, metrics, tasks, upload_storage
+from web_analyzer.analysis_executor import AnalysisExecutorBusy
 from web_analyzer.forms import UploadChatForm
+from web_analyzer.upload_handlers import ChatParsingUploadHandler
 
 
 logger = logging.getLogger("general")
 
 
-CHAT_EXPORTS_DIRECTORY = "data"
 SESSION_CHAT_FIELD = "chat_file_name"
-NODE_TRACES_FIELD = "node_traces"
-EDGE_TRACES_FIELD = "edge_traces"
+ANALYSIS_KEY_FIELD = "analysis_key"
+SELECTED_NODES_FIELD = "selected_nodes"
+
+
+def is_session_analysis(request, analysis_key):
+    """Whether `analysis_key` is the chat uploaded in the session, the only one whose messages and analysis the
+    session can read"""
+    return bool(analysis_key) and request.session.get(ANALYSIS_KEY_FIELD) == analysis_key
 
 
 class HomeView(RedirectView):
@@ -43,50 +49,70 @@ class RedirectToHomeIfErrorDecodingMixin(object):
             return redirect(f"{reverse('home')}?decodingerror=true")
 
 
+# The upload handlers have to be replaced before the CSRF middleware reads request.POST, so the CSRF check is done
+# in `post` instead (https://docs.djangoproject.com/en/3.1/topics/http/file-uploads/#modifying-upload-handlers-on-the-fly)
+@method_decorator(csrf_exempt, name="dispatch")
 class UploadChatView(RedirectToHomeIfErrorDecodingMixin, FormView):
     template_name = "upload_chat.html"
     form_class = UploadChatForm
     extra_context = {"title": "Upload Chat Export File"}
     success_url = reverse_lazy("chat_statistics")
 
+    def post(self, request, *args, **kwargs):
+        request.upload_handlers.insert(0, ChatParsingUploadHandler(request))
+        return self._csrf_protected_post(request, *args, **kwargs)
+
+    @method_decorator(csrf_protect)
+    def _csrf_protected_post(self, request, *args, **kwargs):
+        return super().post(request, *args, **kwargs)
+
     def form_valid(self, form):
-        self.remove_old_chat_export()
+        self.release_old_chat_export()
         self.remove_traces()
 
         chat_export = form.files["chat_file"]
         self.request.session[SESSION_CHAT_FIELD] = chat_export.name
 
-        try:
-            chat_text = chat_export.read().decode("utf-8")
-            chat_file_stream = io.StringIO(chat_text)
-            _, node_traces, edge_traces = ChatNetwork(whatsapp_export_file=chat_file_stream).draw(return_traces=True)
-        except Exception:
+        if chat_export.parse_error is not None:
             raise DecodingError
-
-        self.request.session[NODE_TRACES_FIELD] = node_traces
-        self.request.session[EDGE_TRACES_FIELD] = edge_traces
-        self.request.session["selected_nodes"] = []
-
-        logger.info(f"Chat {chat_export.name} uploaded")
+        analysis_key = chat_export.content_hash
+        metrics.record_upload(chat_export.size, chat_export.chat)
+        storage = upload_storage.get_storage()
+        storage.save(analysis_key, chat_export.export_writer)
+        analysis_cache.set_analysis(analysis_key, **{analysis_cache.ACTIVITY_CUBE_FIELD: chat_export.activity_cube})
+
+        is_cached = (
+            analysis_cache.get_status(analysis_key) == analysis_cache.STATUS_PENDING
+            or analysis_cache.get_analysis(analysis_key, *analysis_cache.ANALYSIS_FIELDS) is not None
+        )
+        metrics.record_analysis_cache_lookup(hit=is_cached)
+        if not is_cached:
+            try:
+                tasks.submit_analysis(analysis_key, chat_export.chat, chat_export.name)
+            except AnalysisExecutorBusy:
+                logger.warning(f"Chat {chat_export.name} rejected, the analysis executor is busy")
+                storage.release(analysis_key)
+                del self.request.session[SESSION_CHAT_FIELD]
+                return self.render_to_response(self.get_context_data(form=form, server_busy=True), status=503)
+
+        storage.evict()
+        self.request.session[ANALYSIS_KEY_FIELD] = analysis_key
+        self.request.session[SELECTED_NODES_FIELD] = []
+
+        lookup_statistics = metrics.analysis_cache_lookup_statistics()
+        logger.info(
+            f"Chat {chat_export.name} uploaded ({'cached' if is_cached else 'analysed'}). "
+            f"Analysis cache hits: {lookup_statistics['hits']}, misses: {lookup_statistics['misses']}"
+        )
         return super().form_valid(form)
 
-    @classmethod
-    def save_chat_export(cls, file):
-        file_path = os.path.join(CHAT_EXPORTS_DIRECTORY, file.name)
-        with open(file_path, 'wb+') as destination:
-            for chunk in file.chunks():
-                destination.write(chunk)
-
-    def remove_old_chat_export(self):
-        old_chat_export_file_name = self.request.session.get(SESSION_CHAT_FIELD, None)
-        if old_chat_export_file_name:
-            old_chat_export_file_path = Path(os.path.join(CHAT_EXPORTS_DIRECTORY, old_chat_export_file_name))
-            if old_chat_export_file_path.is_file():
-                os.remove(old_chat_export_file_path)
+    def release_old_chat_export(self):
+        old_analysis_key = self.request.session.get(ANALYSIS_KEY_FIELD, None)
+        if old_analysis_key:
+            upload_storage.get_storage().release(old_analysis_key)
 
     def remove_traces(self):
-        self.request.session[NODE_TRACES_FIELD] = None
-        self.request.session[EDGE_TRACES_FIELD] = None
+        self.request.session[ANALYSIS_KEY_FIELD] = None
 
 
 class RedirectIfChatNameOrTracesAreMissingMixin(object):
@@ -95,9 +121,18 @@ class RedirectIfChatNameOrTracesAreMissingMixin(object):
         if not chat_export_file_name:
             return redirect(reverse("home"))
 
-        node_traces = self.request.session.get(NODE_TRACES_FIELD, None)
-        edge_traces = self.request.session.get(EDGE_TRACES_FIELD, None)
-        if not (node_traces and edge_traces):
+        analysis_key = self.request.session.get(ANALYSIS_KEY_FIELD, None)
+        analysis_status = analysis_cache.get_status(analysis_key)
+        if analysis_status == analysis_cache.STATUS_ERROR:
+            del self.request.session[SESSION_CHAT_FIELD]
+            return redirect(f"{reverse('home')}?decodingerror=true")
+
+        if analysis_status == analysis_cache.STATUS_PENDING:
+            self.analysis = None
+            return super().dispatch(request, *args, **kwargs)
+
+        self.analysis = analysis_cache.get_analysis(analysis_key, *analysis_cache.ANALYSIS_FIELDS)
+        if not self.analysis:
             del self.request.session[SESSION_CHAT_FIELD]
             return redirect(reverse("home"))
 
@@ -112,24 +147,15 @@ class ChatStatisticsView(RedirectIfChatNameOrTracesAreMissingMixin, TemplateView
         context = super().get_context_data(**kwargs)
         chat_export_file_name = self.request.session[SESSION_CHAT_FIELD]
         context["chat_file_name"] = chat_export_file_name
+        context["analysis_pending"] = self.analysis is None
         return context
 
-    def get(self, request, *args, **kwargs):
-        self.update_graphs()
-        return super().get(request, *args, **kwargs)
-
-    def update_graphs(self):
-        def get_traces():
-            node_traces = self.request.session.get(NODE_TRACES_FIELD, None)
-            edge_traces = self.request.session.get(EDGE_TRACES_FIELD, None)
-            return node_traces, edge_traces
 
-        chat_network = ChatNetwork()
-        node_traces, edge_traces = get_traces()
-        fig = chat_network.draw(node_traces=node_traces, edge_traces=edge_traces)
-
-        fig.update_layout(height=800)
-        dash_apps.app.layout = dash_apps.create_app_layout(fig)
+class AnalysisStatusView(View):
+    def get(self, request, *args, **kwargs):
+        analysis_key = request.session.get(ANALYSIS_KEY_FIELD, None)
+        analysis_status = analysis_cache.get_status(analysis_key)
+        return JsonResponse({"status": analysis_status or "missing", "analysis_key": analysis_key})
 
 
 class DecodingError(RuntimeError):